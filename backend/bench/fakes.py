@@ -0,0 +1,301 @@
+"""
+Offline stand-ins for the upstream APIs.
+FakeAnalyticsClient replaces BetaAnalyticsDataClient (blocking, like the
+real gRPC client, so it runs in the upstream worker pool); Search Console
+and Nominatim are served over httpx.MockTransport, so requests go through
+the real HTTP clients, JSON encoding and status handling.
+Data is synthetic but deterministic, shaped like each API's responses.
+"""
+
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List
+from urllib.parse import parse_qs
+
+import httpx
+from google.auth import jwt
+from google.api_core import exceptions as google_exceptions
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse,
+    DimensionHeader,
+    DimensionValue,
+    MetricHeader,
+    MetricType,
+    MetricValue,
+    Row,
+    RunRealtimeReportResponse,
+    RunReportResponse,
+)
+
+# GA4 declares these metric types; every other metric used here is an integer
+METRIC_TYPES = {
+    "bounceRate": MetricType.TYPE_FLOAT,
+    "averageSessionDuration": MetricType.TYPE_SECONDS,
+}
+EVENT_NAMES = ["page_view", "session_start", "scroll", "click", "generate_lead", "first_visit"]
+CHANNELS = ["Organic Search", "Direct", "Referral", "Organic Social", "Paid Search"]
+DEVICES = ["mobile", "desktop", "tablet"]
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+@dataclass
+class UpstreamProfile:
+    """Behaviour of one fake upstream."""
+
+    latency: float = 0.05  # seconds per call
+    jitter: float = 0.25  # +/- fraction of latency
+    error_rate: float = 0.0  # fraction of calls failing with a retryable error
+    rows: int = 200  # rows per report (per day for date-sliced GSC queries)
+
+    def delay(self, rng: random.Random) -> float:
+        return max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+
+class CallCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.reports = 0  # GA4 reports requested (a batch call carries several)
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def enter(self, reports: int = 1):
+        with self._lock:
+            self.calls += 1
+            self.reports += reports
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def exit(self, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += failed
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "reports": self.reports, "errors": self.errors, "maxInFlight": self.max_in_flight}
+
+
+def _days(start: str, end: str) -> List[date]:
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def _dimension_value(name: str, i: int) -> str:
+    if name == "minutesAgo":
+        return f"{i % 30:02d}"
+    if name == "eventName":
+        return EVENT_NAMES[i % len(EVENT_NAMES)]
+    if name == "deviceCategory":
+        return DEVICES[i % len(DEVICES)]
+    if name == "sessionDefaultChannelGroup":
+        return CHANNELS[i % len(CHANNELS)]
+    if name in ("pagePath", "landingPage", "unifiedScreenName"):
+        return f"/page-{i}"
+    if name == "city":
+        return f"Bench City {i}"
+    if name == "country":
+        return ["Brazil", "Portugal", "United States", "Spain"][i % 4]
+    return f"{name} {i}"
+
+
+class FakeAnalyticsClient:
+    """BetaAnalyticsDataClient stand-in (run_report, batch_run_reports, run_realtime_report)."""
+
+    def __init__(self, profile: UpstreamProfile, seed: int = 0):
+        self.profile = profile
+        self.counter = CallCounter()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _call(self, reports: int = 1):
+        with self._rng_lock:
+            delay = self.profile.delay(self._rng)
+            failed = self._rng.random() < self.profile.error_rate
+        self.counter.enter(reports)
+        try:
+            time.sleep(delay)
+            if failed:
+                raise google_exceptions.ServiceUnavailable("fake GA4 backend unavailable")
+        finally:
+            self.counter.exit(failed)
+
+    def _report(self, request, response_cls):
+        dimensions = [d.name for d in request.dimensions]
+        metrics = [m.name for m in request.metrics]
+        if dimensions == ["date"] and request.date_ranges:
+            # One row per day of the requested range
+            keys = [[d.strftime("%Y%m%d")] for d in _days(request.date_ranges[0].start_date, request.date_ranges[0].end_date)]
+        elif dimensions:
+            count = min(self.profile.rows, request.limit or self.profile.rows)
+            keys = [[_dimension_value(name, i) for name in dimensions] for i in range(count)]
+        else:
+            keys = [[]]
+        rows = [
+            Row(
+                dimension_values=[DimensionValue(value=v) for v in key],
+                metric_values=[
+                    MetricValue(value=f"{0.3 + (i % 50) / 100:.4f}" if name in METRIC_TYPES else str(1000 // (i + 1) + 1))
+                    for name in metrics
+                ],
+            )
+            for i, key in enumerate(keys)
+        ]
+        return response_cls(
+            rows=rows,
+            row_count=len(rows),
+            dimension_headers=[DimensionHeader(name=d) for d in dimensions],
+            metric_headers=[
+                MetricHeader(name=m, type_=METRIC_TYPES.get(m, MetricType.TYPE_INTEGER)) for m in metrics
+            ],
+        )
+
+    def run_report(self, request, timeout=None):
+        self._call()
+        return self._report(request, RunReportResponse)
+
+    def run_realtime_report(self, request, timeout=None):
+        self._call()
+        return self._report(request, RunRealtimeReportResponse)
+
+    def batch_run_reports(self, request, timeout=None):
+        self._call(len(request.requests))
+        return BatchRunReportsResponse(reports=[self._report(r, RunReportResponse) for r in request.requests])
+
+
+def service_account_info() -> Dict[str, Any]:
+    """A throwaway service account key, so the real JWT token exchange runs."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "token_uri": TOKEN_URI,
+    }
+
+
+class FakeSearchConsole:
+    """
+    Search Console REST API (searchAnalytics.query, sitemaps, sites) and the
+    OAuth token endpoint over MockTransport. Token requests are checked like
+    Google does: the posted assertion must be a JWT-bearer token for this
+    audience, or the grant is rejected.
+    """
+
+    def __init__(self, profile: UpstreamProfile, seed: int = 0):
+        self.profile = profile
+        self.counter = CallCounter()
+        self.tokens_issued = 0
+        self.assertions_rejected = 0
+        self._rng = random.Random(seed)
+
+    def _token(self, request: httpx.Request) -> httpx.Response:
+        form = {k: v[0] for k, v in parse_qs(request.content.decode()).items()}
+        try:
+            if form.get("grant_type") != "urn:ietf:params:oauth:grant-type:jwt-bearer":
+                raise ValueError(f"unsupported grant_type {form.get('grant_type')!r}")
+            claims = jwt.decode(form.get("assertion", ""), verify=False)
+            if claims.get("aud") != TOKEN_URI or not claims.get("scope"):
+                raise ValueError("wrong audience or scope")
+        except ValueError as e:
+            self.assertions_rejected += 1
+            return httpx.Response(400, json={"error": "invalid_grant", "error_description": str(e)})
+        self.tokens_issued += 1
+        return httpx.Response(200, json={"access_token": f"bench-token-{self.tokens_issued}", "expires_in": 3600})
+
+    def _rows(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        dimensions = body.get("dimensions", [])
+        days = _days(body["startDate"], body["endDate"])
+        per_day = self.profile.rows if "date" in dimensions else self.profile.rows * 4
+        slices = days if "date" in dimensions else [None]
+        rows = []
+        for day in slices:
+            for i in range(per_day):
+                keys = []
+                for name in dimensions:
+                    if name == "date":
+                        keys.append(day.isoformat())
+                    elif name == "query":
+                        keys.append(f"dental query {i}")
+                    elif name == "page":
+                        keys.append(f"https://example.com/page-{i % 40}")
+                    else:
+                        keys.append(f"{name} {i}")
+                impressions = 5000 // (i + 1) + 10
+                clicks = impressions // 10
+                rows.append({
+                    "keys": keys,
+                    "clicks": clicks,
+                    "impressions": impressions,
+                    "ctr": clicks / impressions,
+                    "position": 1 + i / 10,
+                })
+                if "date" in dimensions and len(dimensions) == 1:
+                    break
+        start = body.get("startRow", 0)
+        return rows[start:start + body.get("rowLimit", 1000)]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == TOKEN_URI:
+            # Not counted as a Search Console call
+            return self._token(request)
+        self.counter.enter()
+        failed = self._rng.random() < self.profile.error_rate
+        try:
+            await asyncio.sleep(self.profile.delay(self._rng))
+            if failed:
+                return httpx.Response(503, json={"error": {"code": 503, "message": "fake GSC backend unavailable"}})
+            path = request.url.path
+            if path.endswith("/searchAnalytics/query"):
+                return httpx.Response(200, json={"rows": self._rows(json.loads(request.content))})
+            if path.endswith("/sitemaps"):
+                return httpx.Response(200, json={"sitemap": [{
+                    "path": "https://example.com/sitemap.xml",
+                    "lastDownloaded": "2026-01-01T00:00:00Z",
+                    "isPending": False,
+                    "errors": "0",
+                    "warnings": "0",
+                    "contents": [{"type": "web", "submitted": "120", "indexed": "118"}],
+                }]})
+            if path.endswith("/sites"):
+                return httpx.Response(200, json={"siteEntry": [{"siteUrl": "sc-domain:example.com", "permissionLevel": "siteOwner"}]})
+            return httpx.Response(404, json={"error": {"code": 404}})
+        finally:
+            self.counter.exit(failed)
+
+
+class FakeNominatim:
+    """Nominatim /search over MockTransport; coordinates derive from the query."""
+
+    def __init__(self, profile: UpstreamProfile, seed: int = 0):
+        self.profile = profile
+        self.counter = CallCounter()
+        self._rng = random.Random(seed)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.counter.enter()
+        failed = self._rng.random() < self.profile.error_rate
+        try:
+            await asyncio.sleep(self.profile.delay(self._rng))
+            if failed:
+                return httpx.Response(503)
+            digest = hashlib.blake2b(request.url.params.get("q", "").encode(), digest_size=4).digest()
+            lat = int.from_bytes(digest[:2], "big") / 65535 * 120 - 60
+            lng = int.from_bytes(digest[2:], "big") / 65535 * 340 - 170
+            return httpx.Response(200, json=[{"lat": f"{lat:.5f}", "lon": f"{lng:.5f}"}])
+        finally:
+            self.counter.exit(failed)
@@ -0,0 +1,454 @@
+"""
+Offline benchmark for the analytics API.
+
+    cd backend
+    python -m bench.run                          # warm scenario, compared to its baseline
+    python -m bench.run --scenario cold --save   # run and store as the new baseline
+    python -m bench.run --scenario errors --check   # exit 1 on regressions
+
+GA4, Search Console and Nominatim are replaced by the fakes in bench.fakes
+and the app is driven in-process through httpx's ASGI transport, so runs
+need no credentials or network. Every round, each simulated client loads
+every /api/* endpoint (at most BROWSER_CONNECTIONS requests at a time, like
+a browser); the report gives p50/p95/p99 latency per endpoint, throughput,
+upstream call and report counts and memory. Baselines live in
+bench/baselines/; --check gates latency and throughput only
+against a baseline recorded on the same machine (see "environment"),
+upstream counts always.
+
+Scenarios:
+- warm: caches persist across rounds (the steady state of the dashboard)
+- cold: in-memory caches are dropped before every round (upstream path,
+  coalescing and batching)
+- errors: like cold, with 10% of upstream calls failing
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+# Requests a browser keeps in flight per origin
+BROWSER_CONNECTIONS = 6
+# Relative change reported as a regression (latency up / throughput down / upstream calls up)
+REGRESSION_THRESHOLD = 0.25
+# Latency changes below this (ms) are noise, whatever the ratio
+REGRESSION_MIN_MS = 5.0
+# Percentiles gated by --check. Concurrent clients coalesce onto one upstream
+# call, so an endpoint's samples come in clusters of one per round: its p95
+# is the slowest round. Endpoints are gated on p50; p95 only over all requests.
+GATED_PERCENTILES = ("p50", "p95")
+GATED_ENDPOINT_PERCENTILES = ("p50",)
+# Independent runs per benchmark; timings are the median across them, since
+# coalesced requests make one slow round move a whole endpoint's percentiles
+DEFAULT_REPEATS = 3
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "warm": {"clients": 8, "rounds": 10, "cold": False, "error_rate": 0.0},
+    "cold": {"clients": 8, "rounds": 5, "cold": True, "error_rate": 0.0},
+    "errors": {"clients": 8, "rounds": 5, "cold": True, "error_rate": 0.1},
+}
+
+Request = Tuple[str, str, str, Optional[Dict[str, Any]]]
+
+# (name, method, path, JSON body)
+ENDPOINTS: List[Request] = [
+    ("stats", "GET", "/api/stats?days=7", None),
+    ("leads", "GET", "/api/leads?days=28", None),
+    ("pageviews-series", "GET", "/api/pageviews-series?days=30", None),
+    ("top-pages", "GET", "/api/top-pages?days=7", None),
+    ("devices", "GET", "/api/devices?days=7", None),
+    ("channels", "GET", "/api/channels?days=7", None),
+    ("referrers", "GET", "/api/referrers?days=7", None),
+    ("countries", "GET", "/api/countries?days=7", None),
+    ("cities", "GET", "/api/cities?days=7", None),
+    ("browsers", "GET", "/api/browsers?days=7", None),
+    ("operating-systems", "GET", "/api/operating-systems?days=7", None),
+    ("events", "GET", "/api/events?days=7", None),
+    ("landing-pages", "GET", "/api/landing-pages?days=7", None),
+    ("exit-pages", "GET", "/api/exit-pages?days=7", None),
+    ("realtime", "GET", "/api/realtime", None),
+    ("geocode-cities", "POST", "/api/geocode-cities", {
+        "cities": [{"city": f"Bench City {i}", "country": "Brazil", "users": 10 - i} for i in range(10)]
+        + [{"city": "Lisbon", "country": "Portugal", "users": 3}],
+    }),
+    ("seo-overview", "GET", "/api/seo/overview?days=28", None),
+    ("seo-queries", "GET", "/api/seo/queries?days=28", None),
+    ("seo-pages", "GET", "/api/seo/pages?days=28", None),
+    ("seo-export", "GET", "/api/seo/export?days=28&dimensions=query,page&max_rows=5000", None),
+    ("seo-sitemaps", "GET", "/api/seo/sitemaps", None),
+    ("seo-movers", "GET", "/api/seo/movers?days=7", None),
+    ("seo-query-history", "GET", "/api/seo/query-history?query=dental%20query%201", None),
+    ("seo-page-history", "GET", "/api/seo/page-history?page=https%3A%2F%2Fexample.com%2Fpage-1", None),
+    ("seo-cannibalization", "GET", "/api/seo/cannibalization", None),
+    ("dashboard", "GET", "/api/dashboard?days=7", None),
+    ("cache-stats", "GET", "/api/cache/stats", None),
+    ("refresh-status", "GET", "/api/refresh/status", None),
+]
+
+
+def configure_environment(workdir: str):
+    """Settings for an offline run; must happen before `main` is imported."""
+    os.environ.update({
+        "GA_PROPERTY_ID": "123456",
+        "GSC_PROPERTY_URL": "sc-domain:example.com",
+        "REFRESH_ENABLED": "false",
+        "REPORT_STORE_PATH": os.path.join(workdir, "report_store.sqlite3"),
+        "SEO_WAREHOUSE_PATH": os.path.join(workdir, "seo_warehouse.sqlite3"),
+        "GEOCODE_STORE_PATH": os.path.join(workdir, "geocoding.sqlite3"),
+        # Measure the code, not Nominatim's 1 request/second usage policy
+        "GEOCODE_RATE": "1000",
+    })
+    from bench.fakes import service_account_info
+    os.environ["GOOGLE_CREDENTIALS_JSON"] = json.dumps(service_account_info())
+    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+
+
+def install_fakes(args) -> Dict[str, Any]:
+    """Point main, gsc and geocoding at the fake upstreams."""
+    import httpx
+    import main
+    import gsc
+    import geocoding
+    from bench.fakes import FakeAnalyticsClient, FakeNominatim, FakeSearchConsole, UpstreamProfile
+
+    ga = FakeAnalyticsClient(UpstreamProfile(args.ga_latency / 1000, error_rate=args.error_rate, rows=args.rows), args.seed)
+    search_console = FakeSearchConsole(UpstreamProfile(args.gsc_latency / 1000, error_rate=args.error_rate, rows=args.rows), args.seed)
+    nominatim = FakeNominatim(UpstreamProfile(args.nominatim_latency / 1000, error_rate=args.error_rate), args.seed)
+
+    main._client = ga
+    main._realtime_client = ga
+    # The OAuth token exchange goes through the fake too (see FakeSearchConsole._token)
+    gsc._http_client = httpx.AsyncClient(transport=httpx.MockTransport(search_console.handle))
+    geocoding._http_client = httpx.AsyncClient(transport=httpx.MockTransport(nominatim.handle))
+    return {"ga4": ga, "gsc": search_console, "nominatim": nominatim}
+
+
+def drop_caches():
+    """Forget in-memory results (persistent stores keep their finalized data)."""
+    import main
+    main.report_cache.invalidate()
+    main._realtime_cache = None
+    main._realtime_cache_expiry = None
+
+
+def rss_mb() -> float:
+    """Current resident set size (MB), from /proc when available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+async def run_benchmark(args, fakes: Dict[str, Any]) -> Dict[str, Any]:
+    import httpx
+    import main
+
+    latencies: Dict[str, List[float]] = {name: [] for name, *_ in ENDPOINTS}
+    failures: Dict[str, int] = {name: 0 for name, *_ in ENDPOINTS}
+
+    async def send(client: httpx.AsyncClient, request: Request):
+        name, method, path, body = request
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        latencies[name].append(time.perf_counter() - started)
+        if not ok:
+            failures[name] += 1
+
+    async def page_load(client: httpx.AsyncClient):
+        slots = asyncio.Semaphore(BROWSER_CONNECTIONS)
+
+        async def limited(request: Request):
+            async with slots:
+                await send(client, request)
+
+        await asyncio.gather(*(limited(request) for request in ENDPOINTS))
+
+    rss_before = rss_mb()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                if args.cold:
+                    drop_caches()
+                await asyncio.gather(*(page_load(client) for _ in range(args.clients)))
+            elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "config": {
+            "clients": args.clients,
+            "rounds": args.rounds,
+            "cold": args.cold,
+            "errorRate": args.error_rate,
+            "rows": args.rows,
+            "latencyMs": {"ga4": args.ga_latency, "gsc": args.gsc_latency, "nominatim": args.nominatim_latency},
+            "seed": args.seed,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "overall": {
+            **summarize([v for values in latencies.values() for v in values]),
+            "requests": total,
+            "failures": sum(failures.values()),
+            "seconds": round(elapsed, 3),
+            "throughput": round(total / elapsed, 1) if elapsed else 0.0,
+        },
+        "endpoints": {
+            name: {**summarize(values), "failures": failures[name]}
+            for name, values in latencies.items()
+        },
+        "upstream": {name: fake.counter.stats() for name, fake in fakes.items()},
+        "oauth": {"tokensIssued": fakes["gsc"].tokens_issued, "assertionsRejected": fakes["gsc"].assertions_rejected},
+        "cache": main.report_cache.stats(),
+        "memory": {
+            "rssBeforeMb": round(rss_before, 1),
+            "rssAfterMb": round(rss_mb(), 1),
+            "peakRssMb": round(peak_rss_mb(), 1),
+        },
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], timings: bool = True) -> List[str]:
+    """
+    Regressions of `result` against `baseline`, as readable lines. Latency
+    and throughput are only compared with `timings` (same machine).
+    """
+    regressions = []
+
+    def latency(label: str, now: Dict[str, float], before: Dict[str, float], keys: Tuple[str, ...]):
+        for key in keys:
+            old, new = before.get(key, 0.0), now.get(key, 0.0)
+            if new - old > REGRESSION_MIN_MS and new > old * (1 + REGRESSION_THRESHOLD):
+                regressions.append(f"{label} {key}: {old:.1f}ms -> {new:.1f}ms")
+
+    if timings:
+        latency("overall", result["overall"], baseline["overall"], GATED_PERCENTILES)
+        for name, now in result["endpoints"].items():
+            if name in baseline["endpoints"]:
+                latency(name, now, baseline["endpoints"][name], GATED_ENDPOINT_PERCENTILES)
+
+        old_tp, new_tp = baseline["overall"]["throughput"], result["overall"]["throughput"]
+        if new_tp < old_tp * (1 - REGRESSION_THRESHOLD):
+            regressions.append(f"throughput: {old_tp} -> {new_tp} req/s")
+
+    for api, now in result["upstream"].items():
+        before = baseline["upstream"].get(api, {})
+        # Without injected failures (retries) the reports requested are deterministic:
+        # any growth means lost caching/coalescing
+        exact = not before.get("errors") and not now["errors"]
+        limit = before.get("reports", 0) * (1 if exact else 1 + REGRESSION_THRESHOLD)
+        if "reports" in before and now["reports"] > limit:
+            regressions.append(f"{api} upstream reports: {before['reports']} -> {now['reports']}")
+        # Calls depend on how reports happened to fall into batch windows
+        if "calls" in before and now["calls"] > before["calls"] * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{api} upstream calls: {before['calls']} -> {now['calls']}")
+    return regressions
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    def delta(now: float, before: Optional[float]) -> str:
+        if not before:
+            return ""
+        return f" ({(now - before) / before * 100:+.0f}%)"
+
+    base_endpoints = baseline["endpoints"] if baseline else {}
+    print(f"{'endpoint':<22}{'n':>6}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'fail':>6}")
+    rows = list(result["endpoints"].items()) + [("overall", result["overall"])]
+    for name, stats in rows:
+        before = (baseline["overall"] if name == "overall" else base_endpoints.get(name, {})) if baseline else {}
+        cells = [f"{stats[k]:.1f}{delta(stats[k], before.get(k))}" for k in ("p50", "p95", "p99")]
+        print(f"{name:<22}{stats['count']:>6}{cells[0]:>18}{cells[1]:>18}{cells[2]:>18}{stats['failures']:>6}")
+
+    overall = result["overall"]
+    before_tp = baseline["overall"]["throughput"] if baseline else None
+    print(f"\nthroughput: {overall['throughput']} req/s{delta(overall['throughput'], before_tp)}"
+          f" ({overall['requests']} requests in {overall['seconds']}s)")
+    print("upstream:   " + ", ".join(
+        f"{api} {stats['calls']} calls for {stats['reports']} reports"
+        f" ({stats['errors']} failed, max {stats['maxInFlight']} in flight)"
+        for api, stats in result["upstream"].items()
+    ))
+    oauth = result["oauth"]
+    print(f"oauth:      {oauth['tokensIssued']} tokens issued, {oauth['assertionsRejected']} assertions rejected")
+    cache = result["cache"]
+    print(f"cache:      hit rate {cache['hitRate']}, {cache['misses']} misses, {cache['evictions']} evictions")
+    memory = result["memory"]
+    print(f"memory:     rss {memory['rssBeforeMb']} -> {memory['rssAfterMb']} MB, peak {memory['peakRssMb']} MB")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with fake GA4, GSC and Nominatim backends.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="warm")
+    parser.add_argument("--clients", type=int, help="concurrent dashboard viewers")
+    parser.add_argument("--rounds", type=int, help="page loads per client")
+    parser.add_argument("--error-rate", type=float, help="fraction of failing upstream calls")
+    parser.add_argument("--rows", type=int, default=200, help="rows per fake report")
+    parser.add_argument("--ga-latency", type=float, default=80, help="GA4 latency (ms)")
+    parser.add_argument("--gsc-latency", type=float, default=60, help="Search Console latency (ms)")
+    parser.add_argument("--nominatim-latency", type=float, default=150, help="Nominatim latency (ms)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEATS, help="independent runs (timings are their median)")
+    parser.add_argument("--save", action="store_true", help="store the result as the scenario baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 when the result regresses against the baseline")
+    parser.add_argument("--json", metavar="PATH", help="also write the full result to PATH")
+    args = parser.parse_args(argv)
+
+    scenario = SCENARIOS[args.scenario]
+    args.clients = args.clients or scenario["clients"]
+    args.rounds = args.rounds or scenario["rounds"]
+    args.error_rate = scenario["error_rate"] if args.error_rate is None else args.error_rate
+    args.cold = scenario["cold"]
+    return args
+
+
+def run_once(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        configure_environment(workdir)
+        import_started = time.perf_counter()
+        fakes = install_fakes(args)
+        import_seconds = time.perf_counter() - import_started
+        result = asyncio.run(run_benchmark(args, fakes))
+    result["overall"]["importSeconds"] = round(import_seconds, 3)
+    return result
+
+
+def run_repeated(args) -> Dict[str, Any]:
+    """Run the benchmark `args.repeat` times, each in a fresh process, and merge the results."""
+    child_argv = [
+        "--scenario", args.scenario, "--clients", str(args.clients), "--rounds", str(args.rounds),
+        "--error-rate", str(args.error_rate), "--rows", str(args.rows), "--ga-latency", str(args.ga_latency),
+        "--gsc-latency", str(args.gsc_latency), "--nominatim-latency", str(args.nominatim_latency),
+        "--seed", str(args.seed), "--repeat", "1",
+    ]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-runs-") as workdir:
+        for i in range(args.repeat):
+            print(f"run {i + 1}/{args.repeat}...", flush=True)
+            path = os.path.join(workdir, f"run-{i}.json")
+            subprocess.run(
+                [sys.executable, "-m", "bench.run", *child_argv, "--json", path],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                stdout=subprocess.DEVNULL,
+            )
+            with open(path, encoding="utf-8") as f:
+                results.append(json.load(f))
+    print()
+    return merge_results(results)
+
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median timings across runs; worst case for counts and memory."""
+    merged = json.loads(json.dumps(results[0]))
+
+    def median(get) -> float:
+        return round(statistics.median(get(r) for r in results), 2)
+
+    for key in ("p50", "p95", "p99", "max", "seconds", "throughput", "importSeconds"):
+        merged["overall"][key] = median(lambda r: r["overall"][key])
+    merged["overall"]["failures"] = max(r["overall"]["failures"] for r in results)
+    for name, stats in merged["endpoints"].items():
+        for key in ("p50", "p95", "p99", "max"):
+            stats[key] = median(lambda r: r["endpoints"][name][key])
+        stats["failures"] = max(r["endpoints"][name]["failures"] for r in results)
+    for api, stats in merged["upstream"].items():
+        for key in stats:
+            stats[key] = max(r["upstream"][api][key] for r in results)
+    for key in merged["oauth"]:
+        merged["oauth"][key] = max(r["oauth"][key] for r in results) if key == "assertionsRejected" else min(
+            r["oauth"][key] for r in results
+        )
+    for key in merged["memory"]:
+        merged["memory"][key] = max(r["memory"][key] for r in results)
+    merged["repeats"] = len(results)
+    return merged
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    result = run_repeated(args) if args.repeat > 1 else run_once(args)
+    result["scenario"] = args.scenario
+
+    baseline_path = os.path.join(BASELINE_DIR, f"{args.scenario}.json")
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != result["config"]:
+            print("Baseline was recorded with a different configuration; not comparing.\n")
+            baseline = None
+    # Timings only mean something on the machine that recorded them; upstream counts are portable
+    same_machine = baseline is not None and baseline.get("environment") == result["environment"]
+    if baseline is not None and not same_machine:
+        print("Baseline was recorded on a different machine; only upstream counts are checked.\n")
+
+    print(f"scenario: {args.scenario}  clients: {args.clients}  rounds: {args.rounds}  runs: {args.repeat}\n")
+    print_report(result, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    regressions = compare(result, baseline, timings=same_machine) if baseline else []
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for line in regressions:
+            print(f"  - {line}")
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {os.path.relpath(baseline_path)}")
+
+    oauth = result["oauth"]
+    if oauth["assertionsRejected"] or not oauth["tokensIssued"]:
+        # Every Search Console call fails in production when the token exchange does
+        print("\nSearch Console OAuth token exchange failed: the token endpoint rejected the assertion.")
+        return 1
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
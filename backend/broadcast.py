@@ -0,0 +1,139 @@
+"""
+Push updates for polled data.
+One poll loop fetches a snapshot on a fixed cadence and fans it out to every
+subscriber as a full snapshot (on subscribe) followed by JSON merge patches
+(RFC 7396), so upstream cost does not grow with the number of viewers.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+_MISSING = object()
+
+
+def merge_patch(old: Any, new: Any) -> Any:
+    """
+    RFC 7396 merge patch turning `old` into `new` (None when they are equal).
+    Objects are diffed key by key, removed keys become null; any other value
+    (lists included) is replaced whole.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return None if old == new else new
+    patch: Dict[str, Any] = {}
+    for key in old.keys() - new.keys():
+        patch[key] = None
+    for key, value in new.items():
+        previous = old.get(key, _MISSING)
+        if previous is _MISSING:
+            patch[key] = value
+        elif isinstance(previous, dict) and isinstance(value, dict):
+            nested = merge_patch(previous, value)
+            if nested is not None:
+                patch[key] = nested
+        elif previous != value:
+            patch[key] = value
+    return patch or None
+
+
+Event = Tuple[str, Any]
+
+
+class Broadcaster:
+    """
+    Polls `fetch` every `interval` seconds while anyone is subscribed.
+    Subscribers receive ("snapshot", data), then ("patch", merge patch) for
+    each change and ("poll-error", {"detail": ...}) for failed polls; a
+    subscriber that falls `queue_size` events behind is resynced with a new
+    snapshot.
+    Idle subscribers get ("heartbeat", None) every `heartbeat` seconds.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[Any]],
+        interval: float,
+        queue_size: int = 8,
+        heartbeat: float = 15.0,
+    ):
+        self.fetch = fetch
+        self.interval = interval
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.snapshot: Any = None
+        self.polls = 0
+        self.resyncs = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self) -> AsyncIterator[Event]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        if self.snapshot is not None:
+            queue.put_nowait(("snapshot", self.snapshot))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ("heartbeat", None)
+        finally:
+            self._subscribers.discard(queue)
+
+    def _publish(self, event: str, data: Any):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                if self.snapshot is None:
+                    # Nothing to resync from yet (only errors so far): drop the oldest
+                    queue.get_nowait()
+                    queue.put_nowait((event, data))
+                    continue
+                # Patches only apply in order: replace the backlog with a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("snapshot", self.snapshot))
+                self.resyncs += 1
+
+    async def _loop(self):
+        try:
+            while self._subscribers:
+                self.polls += 1
+                try:
+                    snapshot = await self.fetch()
+                except Exception as e:
+                    self._publish("poll-error", {"detail": str(getattr(e, "detail", e))})
+                else:
+                    previous, self.snapshot = self.snapshot, snapshot
+                    if previous is None:
+                        self._publish("snapshot", snapshot)
+                    else:
+                        patch = merge_patch(previous, snapshot)
+                        if patch is not None:
+                            self._publish("patch", patch)
+                await asyncio.sleep(self.interval)
+        finally:
+            self._task = None
+
+    async def stop(self):
+        task = self._task
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "polling": self._task is not None,
+            "polls": self.polls,
+            "resyncs": self.resyncs,
+        }
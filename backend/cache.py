@@ -0,0 +1,170 @@
+"""
+In-memory response cache for upstream reports.
+TTL entries with LRU eviction and stale-while-revalidate background refresh.
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+class refresh_ahead:
+    """
+    Within the block (and tasks it spawns), get_or_fetch re-fetches inline
+    every entry that is missing, stale or would expire within `within`
+    seconds, once per key, and fetch errors propagate instead of falling
+    back to the old value. Entries with more life left are served as usual.
+    Used by refresh jobs: `within` is the time to their next run.
+    """
+
+    __slots__ = ("within", "refreshed", "token")
+
+    def __init__(self, within: float):
+        self.within = within
+        self.refreshed: Set[Hashable] = set()
+
+    def __enter__(self):
+        self.token = _refresh_ahead.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _refresh_ahead.reset(self.token)
+        return False
+
+
+# The refresh_ahead block the current task runs in, if any
+_refresh_ahead: ContextVar[Optional[refresh_ahead]] = ContextVar("report_cache_refresh_ahead", default=None)
+
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at", "expires_at", "stale_until", "refreshing")
+
+    def __init__(self, value: Any, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.fetched_at = now
+        self.expires_at = now + ttl
+        self.stale_until = self.expires_at + stale_ttl
+        self.refreshing = False
+
+
+class ReportCache:
+    """
+    LRU cache of report results.
+
+    - Fresh entries (younger than `ttl`) are served directly.
+    - Stale entries (within `stale_ttl` after expiry) are served immediately
+      while a background task refreshes them.
+    - Anything older is fetched inline; with `stale_if_error`, a failed
+      fetch falls back to the expired value when one is still held.
+    - Inside refresh_ahead(), entries close to expiry are re-fetched inline.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+        self.stale_on_error = 0
+        self.refreshed_ahead = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0):
+        self._entries[key] = CacheEntry(value, ttl, stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0,
+        stale_if_error: bool = False
+    ) -> Any:
+        """Return the cached value for `key`, fetching or refreshing it as needed."""
+        entry = self.get(key)
+        now = time.monotonic()
+
+        ahead = _refresh_ahead.get()
+        if ahead is not None and key not in ahead.refreshed and (
+            entry is None or entry.expires_at - now < ahead.within
+        ):
+            ahead.refreshed.add(key)
+            self.refreshed_ahead += 1
+            value = await fetch()
+            self.set(key, value, ttl, stale_ttl)
+            return value
+
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            return entry.value
+
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            if not entry.refreshing:
+                entry.refreshing = True
+                self._spawn(self._refresh(key, entry, fetch, ttl, stale_ttl))
+            return entry.value
+
+        self.misses += 1
+        try:
+            value = await fetch()
+        except Exception:
+            if stale_if_error and entry is not None:
+                self.stale_on_error += 1
+                return entry.value
+            raise
+        self.set(key, value, ttl, stale_ttl)
+        return value
+
+    async def _refresh(self, key, entry, fetch, ttl, stale_ttl):
+        try:
+            value = await fetch()
+            self.set(key, value, ttl, stale_ttl)
+        except Exception as e:
+            # Keep serving the stale value; the next request past expiry retries
+            self.refresh_errors += 1
+            entry.refreshing = False
+            print(f"Cache refresh failed for {key!r}: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshErrors": self.refresh_errors,
+            "staleOnError": self.stale_on_error,
+            "refreshedAhead": self.refreshed_ahead,
+            "hitRate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0,
+        }
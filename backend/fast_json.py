@@ -0,0 +1,170 @@
+"""
+Fast JSON responses.
+Endpoint results are serialized with orjson straight to bytes, skipping
+FastAPI's jsonable_encoder pass and response-model re-validation. Bodies are
+memoized per payload object, so a payload served again from a cache (the
+realtime snapshot, a derived report payload) is neither re-encoded nor
+re-hashed.
+"""
+
+import hashlib
+import functools
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import orjson
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+import timing
+
+# Rendered payloads kept for reuse
+RENDER_CACHE_SIZE = 256
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not serialize natively."""
+    if isinstance(obj, array):
+        return obj.tolist()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the body hash."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+class _LRU:
+    """Small thread-safe LRU used by the render and payload caches."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RenderCache:
+    """
+    Encoded body and ETag per payload object (by identity). The entry keeps a
+    reference to the payload, so its id cannot be reused while cached.
+    Payloads must not be mutated once returned.
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_SIZE):
+        self._lru = _LRU(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, content: Any) -> Tuple[bytes, str]:
+        if content is None or isinstance(content, (str, int, float, bool)):
+            body = orjson.dumps(content)
+            return body, make_etag(body)
+        entry = self._lru.get(id(content))
+        if entry is not None and entry[0] is content:
+            self.hits += 1
+            return entry[1], entry[2]
+        self.misses += 1
+        body = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        etag = make_etag(body)
+        self._lru.set(id(content), (content, body, etag))
+        return body, etag
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class PayloadCache:
+    """
+    Endpoint payloads derived from a cached result, rebuilt only when the
+    result object changes. Returning the same payload object lets
+    RenderCache serve its encoded bytes.
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_SIZE):
+        self._lru = _LRU(max_entries)
+
+    def get(self, key: Hashable, source: Any, build: Callable[[], Any]) -> Any:
+        entry = self._lru.get(key)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        payload = build()
+        self._lru.set(key, (source, payload))
+        return payload
+
+
+render_cache = RenderCache()
+payload_cache = PayloadCache()
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered by orjson (memoized), with a strong ETag."""
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        self._etag: Optional[str] = None
+        super().__init__(content, status_code, headers, media_type, background)
+        if self._etag and status_code == 200 and "etag" not in self.headers:
+            self.headers["etag"] = self._etag
+
+    def render(self, content: Any) -> bytes:
+        with timing.phase("encode"):
+            body, self._etag = render_cache.render(content)
+        return body
+
+
+def degraded(payload: Any) -> bool:
+    """Whether a payload reports errors or a non-ok status (a partial answer)."""
+    return isinstance(payload, dict) and (
+        bool(payload.get("errors")) or payload.get("status", "ok") != "ok"
+    )
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route whose non-Response results are wrapped in FastJSONResponse before
+    FastAPI sees them. The decorated function itself is left untouched (so
+    the dashboard can still call endpoints for their dicts). Degraded
+    payloads go out with Cache-Control: no-store, so the browser asks again
+    instead of holding a partial answer for the endpoint's max-age.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        @functools.wraps(endpoint)
+        async def fast_endpoint(*args, **kw):
+            with timing.phase("handler"):
+                result = await endpoint(*args, **kw)
+            if isinstance(result, Response):
+                return result
+            if degraded(result):
+                return FastJSONResponse(result, headers={"Cache-Control": "no-store"})
+            return FastJSONResponse(result)
+
+        super().__init__(path, fast_endpoint, **kwargs)
@@ -0,0 +1,232 @@
+"""
+Offline gazetteer: city name + country -> coordinates, without network calls.
+
+The source list (gazetteer.tsv, or a GeoNames cities dump) is compiled into a
+compact binary index that is memory-mapped and binary-searched:
+
+    magic "GZT1" | uint32 count | count x uint32 record offsets (sorted by key)
+    records: key (utf-8) | 0x00 | float32 lat | float32 lng
+
+Keys are "normalized name|ISO country code", so lookups ignore case and accents
+("Sao Paulo" and "São Paulo" are the same key).
+
+Usage:
+    python gazetteer.py build                     # from gazetteer.tsv
+    python gazetteer.py build cities15000.txt     # from a GeoNames dump
+"""
+
+import os
+import sys
+import mmap
+import struct
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_SOURCE = os.path.join(BASE_DIR, "gazetteer.tsv")
+GAZETTEER_INDEX = os.getenv("GAZETTEER_INDEX", os.path.join(BASE_DIR, "gazetteer.idx"))
+# Country assumed when GA reports none; almost all traffic is Brazilian
+DEFAULT_COUNTRY = os.getenv("GAZETTEER_DEFAULT_COUNTRY", "BR")
+
+MAGIC = b"GZT1"
+COORDS = struct.Struct("<ff")
+UINT32 = struct.Struct("<I")
+
+# Country names as reported by GA4 (English) and common Portuguese forms
+COUNTRY_CODES = {
+    "brazil": "BR", "brasil": "BR",
+    "united states": "US", "estados unidos": "US", "usa": "US",
+    "portugal": "PT",
+    "united kingdom": "GB", "reino unido": "GB",
+    "ireland": "IE", "irlanda": "IE",
+    "spain": "ES", "espanha": "ES",
+    "france": "FR", "franca": "FR",
+    "germany": "DE", "alemanha": "DE",
+    "netherlands": "NL", "holanda": "NL", "paises baixos": "NL",
+    "italy": "IT", "italia": "IT",
+    "canada": "CA",
+    "mexico": "MX",
+    "colombia": "CO",
+    "peru": "PE",
+    "chile": "CL",
+    "argentina": "AR",
+    "uruguay": "UY", "uruguai": "UY",
+    "japan": "JP", "japao": "JP",
+    "singapore": "SG", "singapura": "SG",
+}
+
+Coords = Optional[Dict[str, float]]
+
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and collapse punctuation/whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    cleaned = "".join(c if c.isalnum() else " " for c in stripped.casefold())
+    return " ".join(cleaned.split())
+
+
+def country_code(country: Optional[str]) -> Optional[str]:
+    """ISO 3166 alpha-2 code for a GA country name (None if unknown/unset)."""
+    if not country:
+        return None
+    country = country.strip()
+    if len(country) == 2 and country.isalpha():
+        return country.upper()
+    return COUNTRY_CODES.get(normalize(country))
+
+
+def canonical_country(country: Optional[str]) -> str:
+    """
+    ISO code when known, DEFAULT_COUNTRY when GA reports none ("" or
+    "(not set)"), otherwise the normalized name.
+    """
+    if not country or country.strip() == "(not set)":
+        return DEFAULT_COUNTRY
+    return country_code(country) or normalize(country)
+
+
+def make_key(city: str, country: Optional[str]) -> str:
+    """Canonical "city|country" key shared by the gazetteer and the geocode store."""
+    return f"{normalize(city)}|{canonical_country(country)}"
+
+
+# ============ Index Build ============
+
+def read_tsv(path: str) -> Iterator[Tuple[str, str, float, float, int]]:
+    """Rows of (name, code, lat, lng, population) from the seed TSV (with alternates)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            name, code, lat, lng = parts[:4]
+            alternates = parts[4].split(",") if len(parts) > 4 and parts[4] else []
+            for n in [name] + alternates:
+                yield n, code, float(lat), float(lng), 0
+
+
+def read_geonames(path: str) -> Iterator[Tuple[str, str, float, float, int]]:
+    """Rows from a GeoNames citiesNNNN.txt dump (name and ASCII name)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            lat, lng, code = float(cols[4]), float(cols[5]), cols[8]
+            population = int(cols[14] or 0)
+            for n in {cols[1], cols[2]}:
+                yield n, code, lat, lng, population
+
+
+def build_index(rows: Iterable[Tuple[str, str, float, float, int]], path: str = GAZETTEER_INDEX) -> int:
+    """Write the binary index; on duplicate keys the most populous place wins."""
+    best: Dict[str, Tuple[int, float, float]] = {}
+    for name, code, lat, lng, population in rows:
+        key = make_key(name, code)
+        if key not in best or population > best[key][0]:
+            best[key] = (population, lat, lng)
+
+    keys = sorted(best)
+    offsets = []
+    records = bytearray()
+    for key in keys:
+        offsets.append(len(records))
+        _, lat, lng = best[key]
+        records += key.encode("utf-8") + b"\x00" + COORDS.pack(lat, lng)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(UINT32.pack(len(keys)))
+        for offset in offsets:
+            f.write(UINT32.pack(offset))
+        f.write(records)
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+# ============ Lookup ============
+
+class Gazetteer:
+    """Memory-mapped, binary-searched view of the gazetteer index."""
+
+    def __init__(self, path: str = GAZETTEER_INDEX, source: str = GAZETTEER_SOURCE):
+        self.path = path
+        self.source = source
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        self._records_start = 0
+
+    def _open(self) -> bool:
+        if self._map is not None:
+            return True
+        with self._lock:
+            if self._map is not None:
+                return True
+            # Dev convenience: (re)build from the seed list if the index is missing or older
+            stale = os.path.exists(self.source) and (
+                not os.path.exists(self.path)
+                or os.path.getmtime(self.path) < os.path.getmtime(self.source)
+            )
+            if stale:
+                try:
+                    build_index(read_tsv(self.source), self.path)
+                except OSError as e:
+                    print(f"Gazetteer build failed: {e}")
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:4] != MAGIC:
+                print(f"Gazetteer index {self.path} is invalid")
+                return False
+            self._count = UINT32.unpack_from(data, 4)[0]
+            self._records_start = 8 + 4 * self._count
+            self._map = data
+            return True
+
+    def __len__(self) -> int:
+        return self._count if self._open() else 0
+
+    def _key_at(self, i: int) -> Tuple[bytes, int]:
+        start = self._records_start + UINT32.unpack_from(self._map, 8 + 4 * i)[0]
+        end = self._map.find(b"\x00", start)
+        return self._map[start:end], end + 1
+
+    def _find(self, key: str) -> Coords:
+        target = key.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            found, coords_at = self._key_at(lo)
+            if found == target:
+                lat, lng = COORDS.unpack_from(self._map, coords_at)
+                return {"lat": round(lat, 4), "lng": round(lng, 4)}
+        return None
+
+    def lookup(self, city: str, country: Optional[str]) -> Coords:
+        """Coordinates for a city, or None when it is not in the index."""
+        if not city or not self._open():
+            return None
+        # Unmapped countries keep a lowercase name and simply never match
+        return self._find(make_key(city, country))
+
+
+gazetteer = Gazetteer()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        rows = read_geonames(sys.argv[2]) if len(sys.argv) > 2 else read_tsv(GAZETTEER_SOURCE)
+        count = build_index(rows)
+        print(f"Wrote {count} entries to {GAZETTEER_INDEX}")
+    else:
+        print(__doc__)
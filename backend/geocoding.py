@@ -0,0 +1,270 @@
+"""
+City geocoding for the realtime map.
+Lookups try the offline gazetteer, then the SQLite store of previous results,
+and only then OpenStreetMap Nominatim.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+import upstream
+import metrics
+from gazetteer import gazetteer, make_key, canonical_country
+
+# Configuration
+GEOCODE_STORE_PATH = os.getenv("GEOCODE_STORE_PATH", "geocoding_cache.sqlite3")
+# Legacy JSON cache, imported once into the store
+LEGACY_CACHE_FILE = "geocoding_cache.json"
+# How long a "not found" result is trusted before retrying (seconds)
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", str(7 * 24 * 3600)))
+# Pending writes that trigger a flush
+GEOCODE_FLUSH_SIZE = int(os.getenv("GEOCODE_FLUSH_SIZE", "50"))
+# Nominatim usage policy: at most 1 request per second
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1"))
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "PAI-Dental-Analytics/1.0 (ferramenta interna de analise)"
+
+Coords = Optional[Dict[str, float]]
+
+
+class GeocodeStore:
+    """
+    Geocoding results keyed by the canonical "city|country" key (see
+    gazetteer.make_key), so spelling, accent and "(not set)" variants of a
+    city share one entry.
+    Lookups hit the primary-key index instead of loading the whole cache;
+    writes are buffered and flushed in a single transaction, so the file is
+    never left half-written. A NULL lat/lng is a negative (not found) entry.
+    """
+
+    def __init__(self, path: str = GEOCODE_STORE_PATH, negative_ttl: int = GEOCODE_NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: Dict[str, Tuple[Coords, float]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocodes (
+                    key TEXT PRIMARY KEY,
+                    lat REAL,
+                    lng REAL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            self._import_legacy()
+            self._migrate_keys()
+        return self._conn
+
+    def _import_legacy(self):
+        """Seed an empty store from the old geocoding_cache.json."""
+        if not os.path.exists(LEGACY_CACHE_FILE):
+            return
+        if self._conn.execute("SELECT 1 FROM geocodes LIMIT 1").fetchone():
+            return
+        try:
+            with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Error loading legacy geocoding cache: {e}")
+            return
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO geocodes (key, lat, lng, updated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (key, coords["lat"], coords["lng"], now) if coords else (key, None, None, now)
+                    for key, coords in legacy.items()
+                ],
+            )
+
+    def _migrate_keys(self):
+        """Rewrite raw "City|Country" keys (schema v0) to canonical keys, collapsing aliases."""
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        merged: Dict[str, Tuple[Optional[float], Optional[float], float]] = {}
+        for key, lat, lng, updated_at in self._conn.execute("SELECT key, lat, lng, updated_at FROM geocodes"):
+            city, _, country = key.partition("|")
+            canonical = make_key(city, country)
+            current = merged.get(canonical)
+            # Prefer a real result over "not found", then the newest
+            if current is None or (current[0] is None and lat is not None) or (
+                (current[0] is None) == (lat is None) and updated_at > current[2]
+            ):
+                merged[canonical] = (lat, lng, updated_at)
+        with self._conn:
+            self._conn.execute("DELETE FROM geocodes")
+            self._conn.executemany(
+                "INSERT INTO geocodes (key, lat, lng, updated_at) VALUES (?, ?, ?, ?)",
+                [(key, lat, lng, ts) for key, (lat, lng, ts) in merged.items()],
+            )
+            self._conn.execute("PRAGMA user_version = 1")
+
+    def get(self, key: str) -> Tuple[bool, Coords]:
+        """Return (found, coords). Expired negative entries count as not found."""
+        with self._lock:
+            if key in self._pending:
+                coords, _ = self._pending[key]
+                return True, coords
+            row = self._connect().execute(
+                "SELECT lat, lng, updated_at FROM geocodes WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return False, None
+        lat, lng, updated_at = row
+        if lat is None:
+            if time.time() - updated_at > self.negative_ttl:
+                return False, None
+            return True, None
+        return True, {"lat": lat, "lng": lng}
+
+    def put(self, key: str, coords: Coords):
+        """Buffer a result; flushed automatically every GEOCODE_FLUSH_SIZE writes."""
+        with self._lock:
+            self._pending[key] = (coords, time.time())
+            should_flush = len(self._pending) >= GEOCODE_FLUSH_SIZE
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Write buffered results in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO geocodes (key, lat, lng, updated_at) VALUES (?, ?, ?, ?)",
+                        [
+                            (key, coords["lat"] if coords else None, coords["lng"] if coords else None, ts)
+                            for key, (coords, ts) in pending.items()
+                        ],
+                    )
+            except Exception as e:
+                # Keep the results for the next flush
+                pending.update(self._pending)
+                self._pending = pending
+                print(f"Error saving geocoding store: {e}")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+geocode_store = GeocodeStore()
+
+_http_client: Optional[httpx.AsyncClient] = None
+_rate_limiter = upstream.TokenBucket(rate=GEOCODE_RATE, capacity=1)
+# Lookups of the same canonical key in flight share one Nominatim request
+_flights = upstream.SingleFlight()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Lazy initialization of the pooled Nominatim HTTP client."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=5.0,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+        )
+    return _http_client
+
+
+async def geocode_city(city: str, country: str) -> Coords:
+    """
+    Geocode a city using OpenStreetMap Nominatim API.
+    Returns None when Nominatim has no match; raises on network/HTTP errors
+    so failures are not cached as "not found".
+    """
+    await _rate_limiter.acquire()
+    params = {
+        "q": city,
+        "format": "json",
+        "limit": 1,
+    }
+    code = canonical_country(country)
+    if len(code) == 2 and code.isupper():
+        params["countrycodes"] = code.lower()
+    else:
+        params["q"] = f"{city}, {country}"
+    with metrics.track_upstream("nominatim", "search"):
+        response = await get_http_client().get(NOMINATIM_URL, params=params)
+        response.raise_for_status()
+    data = response.json()
+
+    if data and len(data) > 0:
+        return {
+            "lat": float(data[0]["lat"]),
+            "lng": float(data[0]["lon"]),
+        }
+    return None
+
+
+def lookup_local(city: str, country: str) -> Tuple[bool, Coords]:
+    """Resolve without network: offline gazetteer, then stored results."""
+    coords = gazetteer.lookup(city, country)
+    if coords:
+        return True, coords
+    return geocode_store.get(make_key(city, country))
+
+
+async def resolve(city: str, country: str) -> Coords:
+    """Return local coordinates, geocoding (once per key) on a miss."""
+    found, coords = lookup_local(city, country)
+    if found:
+        return coords
+    key = make_key(city, country)
+    return await _flights.do(key, lambda: _lookup(key, city, country))
+
+
+async def _lookup(key: str, city: str, country: str) -> Coords:
+    try:
+        coords = await geocode_city(city, country)
+    except Exception as e:
+        print(f"Geocoding error for {city}: {e}")
+        return None
+    geocode_store.put(key, coords)
+    # Flush once the current burst of lookups has drained
+    if len(_flights) <= 1:
+        geocode_store.flush()
+    return coords
+
+
+def warm():
+    """Open the gazetteer index and the geocode store (startup warm-up)."""
+    len(gazetteer)
+    geocode_store.count()
+
+
+def pending_lookups() -> int:
+    return len(_flights)
+
+
+async def close():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    geocode_store.close()
@@ -1,110 +1,300 @@
-
 import os
+import json
+import time
+import asyncio
 import datetime
-from typing import List, Dict, Any, Optional
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Any, Optional
+from urllib.parse import quote
+
+import httpx
 from fastapi import HTTPException
-import json
-import tempfile
+
+if TYPE_CHECKING:
+    from google.auth import crypt
+
+import metrics
 
 # Configuration
 GSC_PROPERTY_URL = os.getenv("GSC_PROPERTY_URL")
+GSC_REQUEST_TIMEOUT = float(os.getenv("GSC_REQUEST_TIMEOUT", "20"))
+
+API_BASE = "https://searchconsole.googleapis.com/webmasters/v3"
+SCOPE = "https://www.googleapis.com/auth/webmasters.readonly"
+DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Largest rowLimit the Search Analytics API accepts per request
+MAX_ROW_LIMIT = 25000
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
 
-_gsc_service = None
+_credentials_info: Optional[Dict[str, Any]] = None
+_signer: Optional["crypt.Signer"] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_access_token: Optional[str] = None
+_token_expiry = 0.0
+_token_lock: Optional[asyncio.Lock] = None
 
-def get_gsc_service():
-    """Lazy initialization of Google Search Console service."""
-    global _gsc_service
-    if _gsc_service:
-        return _gsc_service
+
+def get_credentials_info() -> Optional[Dict[str, Any]]:
+    """Lazy loading of the service account key used for Search Console."""
+    global _credentials_info, _signer
+    if _credentials_info:
+        return _credentials_info
 
     try:
         # Check if credentials JSON is provided directly as env var (cloud)
         creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
         creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        
-        credentials = None
+
+        info = None
 
         if creds_json:
             try:
-                creds_data = json.loads(creds_json)
-                credentials = service_account.Credentials.from_service_account_info(creds_data)
+                info = json.loads(creds_json)
             except json.JSONDecodeError as e:
                 print(f"Warning: Failed to parse GOOGLE_CREDENTIALS_JSON: {e}")
-        
-        if not credentials and creds_path and os.path.exists(creds_path):
-             credentials = service_account.Credentials.from_service_account_file(creds_path)
-        
-        if not credentials:
-             # Fallback: try to find credentials.json in current dir
-             local_creds = "credentials.json"
-             if os.path.exists(local_creds):
-                 credentials = service_account.Credentials.from_service_account_file(local_creds)
-
-        if not credentials:
+
+        if not info and creds_path and os.path.exists(creds_path):
+            with open(creds_path, encoding="utf-8") as f:
+                info = json.load(f)
+
+        if not info:
+            # Fallback: try to find credentials.json in current dir
+            local_creds = "credentials.json"
+            if os.path.exists(local_creds):
+                with open(local_creds, encoding="utf-8") as f:
+                    info = json.load(f)
+
+        if not info:
             raise Exception("No valid Google credentials found.")
 
-        _gsc_service = build('searchconsole', 'v1', credentials=credentials)
-        return _gsc_service
+        # Imported on first use: loading the crypto backend slows startup
+        from google.auth import crypt
+        _signer = crypt.RSASigner.from_service_account_info(info)
+        _credentials_info = info
+        return _credentials_info
     except Exception as e:
-        print(f"Failed to initialize GSC service: {e}")
+        print(f"Failed to initialize GSC credentials: {e}")
         return None
 
+
+def get_http_client() -> httpx.AsyncClient:
+    """Lazy initialization of the pooled Search Console HTTP client."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=GSC_REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+    return _http_client
+
+
+async def get_access_token() -> str:
+    """
+    OAuth access token for the service account (JWT bearer grant).
+    Cached and refreshed TOKEN_REFRESH_MARGIN seconds before expiry; concurrent
+    callers share a single refresh.
+    """
+    global _access_token, _token_expiry, _token_lock
+    if _access_token and time.time() < _token_expiry - TOKEN_REFRESH_MARGIN:
+        return _access_token
+
+    if _token_lock is None:
+        _token_lock = asyncio.Lock()
+
+    async with _token_lock:
+        if _access_token and time.time() < _token_expiry - TOKEN_REFRESH_MARGIN:
+            return _access_token
+
+        info = get_credentials_info()
+        if not info:
+            raise HTTPException(status_code=500, detail="GSC service not initialized")
+
+        from google.auth import jwt
+
+        token_uri = info.get("token_uri", DEFAULT_TOKEN_URI)
+        now = int(time.time())
+        assertion = jwt.encode(_signer, {
+            "iss": info["client_email"],
+            "scope": SCOPE,
+            "aud": token_uri,
+            "iat": now,
+            "exp": now + 3600,
+        })
+
+        try:
+            with metrics.track_upstream("gsc", "token"):
+                response = await get_http_client().post(token_uri, data={
+                    "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+                    # jwt.encode returns bytes; the form field must carry the token text
+                    "assertion": assertion.decode("ascii"),
+                })
+                response.raise_for_status()
+            token = response.json()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"GSC auth error: {str(e)}")
+
+        _access_token = token["access_token"]
+        _token_expiry = now + int(token.get("expires_in", 3600))
+        return _access_token
+
+
+async def api_request(
+    method: str,
+    path: str,
+    body: Optional[Dict[str, Any]] = None,
+    operation: str = "request"
+) -> Dict[str, Any]:
+    """
+    Authenticated Search Console REST call. Raises for HTTP errors.
+    `operation` (and the requested dimensions) label the latency metrics.
+    """
+    token = await get_access_token()
+    report = ",".join(body.get("dimensions", [])) if body else ""
+    with metrics.track_upstream("gsc", operation, report):
+        response = await get_http_client().request(
+            method,
+            f"{API_BASE}{path}",
+            json=body,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+    return response.json()
+
+
+def site_path() -> str:
+    if not GSC_PROPERTY_URL:
+        # Try to discover the property if possible, or raise error
+        # For now, we insist on configuration
+        raise HTTPException(status_code=500, detail="GSC_PROPERTY_URL not configured")
+    return f"/sites/{quote(GSC_PROPERTY_URL, safe='')}"
+
+
 def get_date_range(days: int) -> tuple:
     """Calculate start and end dates for GSC (2 days lag usually)."""
     end_date = datetime.date.today() - datetime.timedelta(days=2)
     start_date = end_date - datetime.timedelta(days=days)
     return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
 
-def fetch_search_analytics(
-    start_date: str, 
-    end_date: str, 
+
+async def query_search_analytics(
+    start_date: str,
+    end_date: str,
     dimensions: List[str] = None,
-    row_limit: int = 1000
+    row_limit: int = 1000,
+    start_row: int = 0
 ) -> List[Dict[str, Any]]:
     """
-    Fetch analytics data from GSC.
+    One Search Analytics query (a single page of at most MAX_ROW_LIMIT rows).
     Ref: https://developers.google.com/webmaster-tools/v1/searchanalytics/query
     """
-    service = get_gsc_service()
-    if not service:
-        raise HTTPException(status_code=500, detail="GSC service not initialized")
-    
-    if not GSC_PROPERTY_URL:
-        # Try to discover the property if possible, or raise error
-        # For now, we insist on configuration
-        raise HTTPException(status_code=500, detail="GSC_PROPERTY_URL not configured")
+    path = f"{site_path()}/searchAnalytics/query"
 
     request = {
         'startDate': start_date,
         'endDate': end_date,
         'dimensions': dimensions or [],
-        'rowLimit': row_limit
+        'rowLimit': min(row_limit, MAX_ROW_LIMIT),
+        'startRow': start_row
     }
 
     try:
-        response = service.searchanalytics().query(
-            siteUrl=GSC_PROPERTY_URL, 
-            body=request
-        ).execute()
-        return response.get('rows', [])
+        response = await api_request("POST", path, request, operation="searchAnalytics.query")
+        rows = response.get('rows', [])
+        metrics.ROWS_DECODED.inc("gsc", amount=len(rows))
+        return rows
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"GSC Query Error: {str(e)}")
 
-def get_sitemaps_status():
+
+async def iter_search_analytics(
+    start_date: str,
+    end_date: str,
+    dimensions: List[str] = None,
+    max_rows: Optional[int] = None,
+    page_size: int = MAX_ROW_LIMIT
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield result pages, paging with startRow until the data (or `max_rows`)
+    runs out. The next page is requested while the caller consumes the
+    current one, and only one page is held at a time.
+    """
+    page_size = min(page_size, MAX_ROW_LIMIT)
+
+    def fetch(start_row: int) -> Optional[asyncio.Task]:
+        if max_rows is not None and start_row >= max_rows:
+            return None
+        limit = page_size if max_rows is None else min(page_size, max_rows - start_row)
+        return asyncio.ensure_future(
+            query_search_analytics(start_date, end_date, dimensions, limit, start_row)
+        )
+
+    start_row = 0
+    pending = fetch(start_row)
+    try:
+        while pending is not None:
+            rows = await pending
+            pending = None
+            requested = page_size if max_rows is None else min(page_size, max_rows - start_row)
+            start_row += len(rows)
+            if len(rows) == requested:
+                # Full page: there may be more, prefetch it
+                pending = fetch(start_row)
+            if rows:
+                yield rows
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def fetch_search_analytics(
+    start_date: str,
+    end_date: str,
+    dimensions: List[str] = None,
+    row_limit: int = 1000
+) -> List[Dict[str, Any]]:
+    """
+    Fetch analytics data from GSC.
+    Limits above MAX_ROW_LIMIT are fetched page by page.
+    """
+    if row_limit <= MAX_ROW_LIMIT:
+        return await query_search_analytics(start_date, end_date, dimensions, row_limit)
+
+    rows = []
+    async for page in iter_search_analytics(start_date, end_date, dimensions, max_rows=row_limit):
+        rows.extend(page)
+    return rows
+
+
+async def get_sitemaps_status():
     """List sitemaps and their status."""
-    service = get_gsc_service()
-    if not service:
-        raise HTTPException(status_code=500, detail="GSC service not initialized")
-        
-    if not GSC_PROPERTY_URL:
-        raise HTTPException(status_code=500, detail="GSC_PROPERTY_URL not configured")
-        
+    path = f"{site_path()}/sitemaps"
+
     try:
-        response = service.sitemaps().list(siteUrl=GSC_PROPERTY_URL).execute()
+        response = await api_request("GET", path, operation="sitemaps.list")
         return response.get('sitemap', [])
-    except Exception as e:
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
         # It's possible to have no permissions specifically for sitemaps or no sitemaps submitted
-        print(f"Sitemap fetch error: {e}")
-        return []
+        if e.response.status_code in (403, 404):
+            print(f"Sitemap fetch error: {e}")
+            return []
+        raise HTTPException(status_code=500, detail=f"GSC Sitemaps Error: {str(e)}")
+    except Exception as e:
+        # Upstream failure: raise rather than answer (and cache) an empty list
+        raise HTTPException(status_code=500, detail=f"GSC Sitemaps Error: {str(e)}")
+
+
+async def list_sites() -> List[Dict[str, Any]]:
+    """List properties the service account can access."""
+    response = await api_request("GET", "/sites", operation="sites.list")
+    return response.get('siteEntry', [])
+
+
+async def close():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
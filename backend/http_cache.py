@@ -0,0 +1,95 @@
+"""
+HTTP caching for the API.
+Buffered 200 responses get a strong ETag (body hash) when the endpoint did
+not set one, and a Cache-Control header from a per-endpoint policy; GET/HEAD
+requests whose If-None-Match matches the ETag are answered with 304 Not
+Modified, so repeat loads move almost no bytes.
+"""
+
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fast_json import make_etag
+
+# (path, query string) -> Cache-Control value, or None for no header
+CachePolicy = Callable[[str, str], Optional[str]]
+
+
+def cache_control(max_age: int, stale_while_revalidate: int = 0) -> str:
+    """Cache-Control for private (admin-only) data."""
+    value = f"private, max-age={max_age}"
+    if stale_while_revalidate:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """RFC 9110 weak comparison of an If-None-Match header against an ETag."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    candidates: Iterable[str] = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return opaque in candidates
+
+
+class HTTPCacheMiddleware:
+    """
+    Pure ASGI middleware, so streaming responses keep streaming: their
+    first chunk is forwarded as soon as it arrives, with Cache-Control but
+    no ETag (the body is not known yet).
+    """
+
+    def __init__(self, app: ASGIApp, policy: CachePolicy):
+        self.app = app
+        self.policy = policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        query = scope.get("query_string", b"").decode("latin-1")
+        start: Optional[Message] = None
+        not_modified = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, not_modified
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    await send(message)
+                    return
+                # Hold the headers until the body shows whether it is buffered
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                if not not_modified:
+                    await send(message)
+                return
+
+            headers: List[Tuple[bytes, bytes]] = list(start["headers"])
+            names = {k.lower() for k, _ in headers}
+            if b"cache-control" not in names:
+                value = self.policy(scope["path"], query)
+                if value:
+                    headers.append((b"cache-control", value.encode("latin-1")))
+            streaming = message.get("more_body", False)
+            if not streaming and b"etag" not in names:
+                headers.append((b"etag", make_etag(message.get("body", b"")).encode("latin-1")))
+
+            etag = Headers(raw=headers).get("etag")
+            if if_none_match and etag and etag_matches(if_none_match, etag):
+                not_modified = True
+                # 304 keeps the caching headers but carries no body
+                headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await send({**start, "headers": headers})
+                await send(message)
+            start = None
+
+        await self.app(scope, receive, send_wrapper)
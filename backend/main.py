@@ -3,53 +3,157 @@ Google Analytics Data API Backend Service
 Fetches analytics metrics from GA4 for the admin dashboard
 """
 
+import time
+_import_started = time.perf_counter()
+
 import os
+import io
+import csv
 import json
-import tempfile
+import secrets
+import asyncio
+import math
+import functools
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException, Query
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Load environment variables
 load_dotenv()
 
+# Local modules read their configuration from the environment at import time
+import upstream
+import metrics
+import timing
+from cache import ReportCache, refresh_ahead
+from report_store import ReportStore, dataset_key
+from report_table import ReportTable
+from scheduler import RefreshScheduler
+from quota import quota_governor
+from fast_json import FastJSONResponse, FastJSONRoute, degraded, payload_cache, render_cache
+from http_cache import HTTPCacheMiddleware, cache_control
+from profiler import PROFILE_MAX_DURATION, ProfilerMiddleware, profiler
+from startup import warmup
+
 # Configuration
 GA_PROPERTY_ID = os.getenv("GA_PROPERTY_ID")
+# Per-call deadline for GA4 requests (seconds)
+GA_REQUEST_TIMEOUT = float(os.getenv("GA_REQUEST_TIMEOUT", "20"))
+# Historical report cache: default freshness, stale-while-revalidate window, size
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "600"))
+REPORT_CACHE_STALE = int(os.getenv("REPORT_CACHE_STALE", "3600"))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+# Days (counted back from today) whose GA4 data may still change and are never stored
+REPORT_STORE_MUTABLE_DAYS = int(os.getenv("REPORT_STORE_MUTABLE_DAYS", "2"))
+# Background refresh: enable flag, cadence for windows up to a week (half the cache TTL,
+# so entries are re-fetched just before they expire; longer windows scale with window_factor),
+# windows to pre-warm (the frontend's 24h/7d/30d/90d periods), spacing between jobs
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "true").lower() in ("1", "true", "yes")
+REFRESH_INTERVAL = int(os.getenv("REFRESH_INTERVAL", str(REPORT_CACHE_TTL // 2)))
+REFRESH_GA_WINDOWS = [int(d) for d in os.getenv("REFRESH_GA_WINDOWS", "1,7,30,90").split(",") if d]
+REFRESH_GSC_WINDOWS = [int(d) for d in os.getenv("REFRESH_GSC_WINDOWS", "28,90").split(",") if d]
+REFRESH_PACE_SECONDS = float(os.getenv("REFRESH_PACE_SECONDS", "1"))
+# GA4 row limit for unbounded reports
+GA_MAX_ROWS = 100000
+# Window for grouping concurrent GA4 reports into one batchRunReports call (0 disables)
+GA_BATCH_WINDOW_MS = float(os.getenv("GA_BATCH_WINDOW_MS", "10"))
+# Browser caching (Cache-Control max-age, seconds); stale-while-revalidate gets the same window
+HTTP_CACHE_REALTIME_MAX_AGE = int(os.getenv("HTTP_CACHE_REALTIME_MAX_AGE", "30"))
+HTTP_CACHE_HISTORICAL_MAX_AGE = int(os.getenv("HTTP_CACHE_HISTORICAL_MAX_AGE", "3600"))
+HTTP_CACHE_LEADS_MAX_AGE = int(os.getenv("HTTP_CACHE_LEADS_MAX_AGE", "300"))
+HTTP_CACHE_GSC_MAX_AGE = int(os.getenv("HTTP_CACHE_GSC_MAX_AGE", "86400"))
+# Max realtime sub-queries in flight per refresh
+REALTIME_MAX_CONCURRENCY = int(os.getenv("REALTIME_MAX_CONCURRENCY", "4"))
+# Poll cadence behind /api/realtime/stream (seconds); matches the realtime cache TTL
+REALTIME_STREAM_INTERVAL = float(os.getenv("REALTIME_STREAM_INTERVAL", "30"))
+# Search Console result cache: GSC data lags by days, so hours of freshness lose nothing
+SEO_CACHE_TTL = int(os.getenv("SEO_CACHE_TTL", str(6 * 3600)))
+SEO_CACHE_STALE = int(os.getenv("SEO_CACHE_STALE", str(24 * 3600)))
+# Local GSC warehouse: days kept in sync by the refresh job (the widest /api/seo/* window),
+# trailing days re-synced (GSC revises them), sync cadence
+SEO_WAREHOUSE_DAYS = int(os.getenv("SEO_WAREHOUSE_DAYS", "480"))
+SEO_WAREHOUSE_MUTABLE_DAYS = int(os.getenv("SEO_WAREHOUSE_MUTABLE_DAYS", "3"))
+SEO_WAREHOUSE_SYNC_INTERVAL = int(os.getenv("SEO_WAREHOUSE_SYNC_INTERVAL", str(6 * 3600)))
+# Most recent days a request may sync inline; older days are left to the refresh job
+SEO_WAREHOUSE_INLINE_DAYS = int(os.getenv("SEO_WAREHOUSE_INLINE_DAYS", "28"))
+# Shared secret for /api/admin/* (sent as X-Admin-Token); unset disables those endpoints
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+# Scope for GA4 service account credentials built from GOOGLE_CREDENTIALS_JSON
+GA_SCOPES = ["https://www.googleapis.com/auth/analytics.readonly"]
+
+def endpoint_max_age(path: str) -> Optional[int]:
+    """How long an endpoint's data stays fresh; None for operational endpoints."""
+    if path == "/api/realtime":
+        return HTTP_CACHE_REALTIME_MAX_AGE
+    if path == "/api/leads":
+        return HTTP_CACHE_LEADS_MAX_AGE
+    if path.startswith("/api/seo/"):
+        return HTTP_CACHE_GSC_MAX_AGE
+    if path in ("/api/cache/stats", "/api/refresh/status") or path.startswith("/api/admin/"):
+        return None
+    if not path.startswith("/api/"):
+        return None
+    return HTTP_CACHE_HISTORICAL_MAX_AGE
+
+
+def http_cache_policy(path: str, query: str) -> Optional[str]:
+    """Cache-Control for a GET response; a dashboard gets its freshest section's."""
+    if path == "/api/dashboard":
+        sections = parse_qs(query).get("sections", [""])[0]
+        names = [n.strip() for n in sections.split(",") if n.strip()] or DEFAULT_DASHBOARD_SECTIONS
+        ages = [
+            endpoint_max_age(f"/api/seo/{n[4:]}" if n.startswith("seo-") else f"/api/{n}")
+            for n in names
+        ]
+        max_age = min(age for age in ages if age is not None)
+    else:
+        max_age = endpoint_max_age(path)
+    if max_age is None:
+        return "no-store"
+    return cache_control(max_age, stale_while_revalidate=max_age)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks."""
+    warmup.start()
+    if REFRESH_ENABLED:
+        register_refresh_jobs()
+        refresh_scheduler.start()
+    yield
+    await warmup.stop()
+    await refresh_scheduler.stop()
+    await realtime_broadcaster.stop()
+    upstream.shutdown()
+    report_store.close()
+    seo_warehouse.close()
+    await geocoding.close()
+    await gsc.close()
 
-# Handle Google credentials from environment variable (for cloud deployment)
-def setup_credentials():
-    """
-    Set up Google credentials from environment variable.
-    Supports both file path (local) and JSON string (cloud deployment).
-    """
-    # Check if credentials JSON is provided directly as env var
-    creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
-    if creds_json:
-        try:
-            # Write to temp file and set the path
-            creds_data = json.loads(creds_json)
-            temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-            json.dump(creds_data, temp_file)
-            temp_file.close()
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = temp_file.name
-            return True
-        except json.JSONDecodeError as e:
-            print(f"Warning: Failed to parse GOOGLE_CREDENTIALS_JSON: {e}")
-            return False
-    return False
-
-# Try to set up credentials from JSON env var
-setup_credentials()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="GA4 Analytics API",
     description="Backend service for fetching Google Analytics data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
+# Endpoint results are rendered by orjson directly (see fast_json)
+app.router.route_class = FastJSONRoute
+
+# ETag + per-endpoint Cache-Control; unchanged payloads are answered with 304
+app.add_middleware(HTTPCacheMiddleware, policy=http_cache_policy)
+# Phase breakdown (upstream, decode, reshape, encode) as a Server-Timing header
+app.add_middleware(timing.ServerTimingMiddleware)
 
 # CORS Configuration
 app.add_middleware(
@@ -60,31 +164,173 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sampled stack profiles, off unless switched on via /api/admin/profiling
+app.add_middleware(ProfilerMiddleware)
+# Outermost (added last), so request latency covers every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
 # ============ Lazy Client Initialization ============
 
 _client = None
+_client_lock = threading.Lock()
 _realtime_client = None
 # Simple in-memory cache for realtime data to prevent hitting rate limits
 _realtime_cache = None
 _realtime_cache_expiry = None
 
+def load_ga_credentials():
+    """
+    Service account credentials from GOOGLE_CREDENTIALS_JSON (cloud
+    deployment), built in memory. None means Application Default
+    Credentials (GOOGLE_APPLICATION_CREDENTIALS file, local gcloud login).
+    """
+    creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
+    if not creds_json:
+        return None
+    try:
+        info = json.loads(creds_json)
+    except json.JSONDecodeError as e:
+        print(f"Warning: Failed to parse GOOGLE_CREDENTIALS_JSON: {e}")
+        return None
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_info(info, scopes=GA_SCOPES)
+
+
 def get_ga_client():
-    """Lazy initialization of GA4 Data API client."""
+    """
+    Lazy initialization of GA4 Data API client.
+    The client library is imported here, not at module load, so the server
+    starts listening without it; startup warm-up (see warm_ga_client) builds
+    the client in the background.
+    """
     global _client
     if _client is None:
-        try:
-            from google.analytics.data_v1beta import BetaAnalyticsDataClient
-            _client = BetaAnalyticsDataClient()
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to initialize GA4 client: {str(e)}"
-            )
+        with _client_lock:
+            if _client is None:
+                try:
+                    from google.analytics.data_v1beta import BetaAnalyticsDataClient
+                    _client = BetaAnalyticsDataClient(credentials=load_ga_credentials())
+                except Exception as e:
+                    raise HTTPException(
+                        status_code=500, 
+                        detail=f"Failed to initialize GA4 client: {str(e)}"
+                    )
     return _client
 
 
+def report_types(request) -> List[str]:
+    """Metrics labels for a GA4 request: "dimensions|metrics" per report (several for batches)."""
+    reports = request.requests if hasattr(request, "requests") else [request]
+    return [
+        f"{','.join(d.name for d in r.dimensions)}|{','.join(m.name for m in r.metrics)}"
+        for r in reports
+    ]
+
+
+async def call_ga(method: str, request) -> Any:
+    """
+    Execute a GA4 Data API call in the upstream worker pool.
+    The client is built off-loop on first use and every call gets a deadline,
+    so a slow GA4 response never blocks other requests. The returned property
+    quota feeds quota_governor; an exhausted quota is a 429 with Retry-After.
+    """
+    from google.api_core import exceptions as google_exceptions
+    
+    # Realtime reports have their own quota; everything else is "core"
+    category = "realtime" if method == "run_realtime_report" else "core"
+    blocked = quota_governor.blocked_for(category)
+    if blocked:
+        quota_governor.rejected += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"GA4 quota exhausted: {quota_governor.budget(category).exhausted_reason}",
+            headers={"Retry-After": str(math.ceil(blocked))}
+        )
+    
+    client = await upstream.run_blocking(get_ga_client)
+    # gRPC deadline ends the worker thread; the outer timeout is a safety net
+    call = functools.partial(getattr(client, method), request, timeout=GA_REQUEST_TIMEOUT)
+    budget = quota_governor.budget(category)
+    budget.in_flight += 1
+    budget.calls += 1
+    try:
+        with metrics.track_upstream("ga4", method, *report_types(request)):
+            response = await upstream.run_blocking(call, timeout=GA_REQUEST_TIMEOUT + 1)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="GA4 API timeout")
+    except google_exceptions.ResourceExhausted as e:
+        backoff = quota_governor.exhausted(category, str(e.message))
+        raise HTTPException(
+            status_code=429,
+            detail=f"GA4 quota exhausted: {e.message}",
+            headers={"Retry-After": str(math.ceil(backoff))}
+        )
+    finally:
+        budget.in_flight -= 1
+    
+    reports = response.reports if method == "batch_run_reports" else [response]
+    for report in reports:
+        quota_governor.observe(category, report.property_quota)
+    return response
+
+
+async def run_report_batch(requests: list) -> list:
+    """
+    Run up to five RunReportRequests for the same property as one
+    batchRunReports call and return the responses in request order.
+    """
+    if len(requests) == 1:
+        return [await call_ga("run_report", requests[0])]
+    
+    from google.analytics.data_v1beta.types import BatchRunReportsRequest
+    
+    batch = BatchRunReportsRequest(property=requests[0].property, requests=requests)
+    response = await call_ga("batch_run_reports", batch)
+    return list(response.reports)
+
+
+# Reports issued within GA_BATCH_WINDOW_MS of each other (e.g. the dashboard
+# overview fan-out) share one upstream round trip. GA4 allows 5 per batch.
+report_batcher = upstream.MicroBatcher(
+    run_report_batch,
+    max_batch=5,
+    window=GA_BATCH_WINDOW_MS / 1000,
+    group_key=lambda request: request.property
+)
+
+
+# ============ Report Cache ============
+
+# Shared cache for historical reports. Stale entries are served while a
+# background refresh runs, so GA4 is hit at most once per TTL per request shape.
+report_cache = ReportCache(max_entries=REPORT_CACHE_MAX_ENTRIES)
+# Finalized per-day rows persisted across restarts
+report_store = ReportStore()
+# Concurrent identical upstream calls (GA4, realtime, GSC) share one request
+flights = upstream.SingleFlight()
+
+
+def report_cache_key(kind: str, request) -> tuple:
+    """
+    Cache key for a GA4 request. The serialized proto covers property,
+    resolved date range, dimensions, metrics, filter, ordering and limit.
+    """
+    return (kind, type(request).serialize(request))
+
+
 # ============ Helper Functions ============
 
+def contiguous_runs(dates: List[str]) -> List[List[str]]:
+    """Split sorted YYYY-MM-DD dates into runs of consecutive days."""
+    runs: List[List[str]] = []
+    for d in dates:
+        if runs and (datetime.strptime(d, "%Y-%m-%d") - datetime.strptime(runs[-1][-1], "%Y-%m-%d")).days == 1:
+            runs[-1].append(d)
+        else:
+            runs.append([d])
+    return runs
+
+
 def get_date_range(days: int) -> tuple:
     """Calculate start and end dates for the given number of days."""
     end_date = datetime.now()
@@ -92,17 +338,30 @@ def get_date_range(days: int) -> tuple:
     return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
 
 
-def run_report(
+def window_factor(days: int) -> float:
+    """
+    Scale for the cache TTL and refresh interval of a `days`-day window: an
+    hour of new data moves a long window proportionally less.
+    """
+    return max(1.0, days / 7)
+
+
+async def run_report(
     dimensions: List[str],
     metrics: List[str],
     days: int,
     dimension_filter = None,
     order_bys = None,
-    limit: int = 100
-) -> List[Dict[str, Any]]:
+    limit: int = 100,
+    cache_ttl: int = REPORT_CACHE_TTL,
+    date_range: Optional[tuple] = None
+) -> ReportTable:
     """
     Generic function to run a GA4 report.
-    Returns list of rows with dimension and metric values.
+    Returns a ReportTable with one column per dimension and metric.
+    Results are cached for `cache_ttl` seconds, scaled by window_factor
+    (see report_cache).
+    `date_range` (start, end) overrides `days` when given.
     """
     from google.analytics.data_v1beta.types import (
         RunReportRequest,
@@ -115,8 +374,7 @@ def run_report(
     if not GA_PROPERTY_ID:
         raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
     
-    client = get_ga_client()
-    start_date, end_date = get_date_range(days)
+    start_date, end_date = date_range or get_date_range(days)
     
     request_params = {
         "property": f"properties/{GA_PROPERTY_ID}",
@@ -124,6 +382,7 @@ def run_report(
         "dimensions": [Dimension(name=d) for d in dimensions] if dimensions else [],
         "metrics": [Metric(name=m) for m in metrics],
         "limit": limit,
+        "return_property_quota": True,
     }
     
     if dimension_filter:
@@ -132,30 +391,35 @@ def run_report(
     if order_bys:
         request_params["order_bys"] = order_bys
     
-    try:
-        request = RunReportRequest(**request_params)
-        response = client.run_report(request)
-        
-        results = []
-        for row in response.rows:
-            row_data = {}
-            for i, dim in enumerate(dimensions):
-                row_data[dim] = row.dimension_values[i].value
-            for i, met in enumerate(metrics):
-                value = row.metric_values[i].value
-                # Try to convert to number
-                try:
-                    row_data[met] = float(value) if '.' in value else int(value)
-                except:
-                    row_data[met] = value
-            results.append(row_data)
-        
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"GA4 API error: {str(e)}")
+    request = RunReportRequest(**request_params)
+    
+    async def fetch() -> ReportTable:
+        try:
+            response = await report_batcher.submit(request)
+            return ReportTable.from_response(response, dimensions, metrics)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"GA4 API error: {str(e)}")
+    
+    key = report_cache_key("rows", request)
+    # As the GA4 quota drains, results are kept (and served stale) for longer
+    factor = quota_governor.ttl_factor("core")
+    return await report_cache.get_or_fetch(
+        key,
+        lambda: flights.do(key, fetch),
+        ttl=cache_ttl * factor * window_factor(days),
+        stale_ttl=REPORT_CACHE_STALE * factor,
+        stale_if_error=True
+    )
 
 
-def run_aggregate_report(metrics: List[str], days: int, exclude_admin: bool = True) -> Dict[str, Any]:
+async def run_aggregate_report(
+    metrics: List[str],
+    days: int,
+    exclude_admin: bool = True,
+    cache_ttl: int = REPORT_CACHE_TTL
+) -> Dict[str, Any]:
     """Run a report without dimensions to get aggregate totals."""
     from google.analytics.data_v1beta.types import (
         RunReportRequest,
@@ -169,13 +433,13 @@ def run_aggregate_report(metrics: List[str], days: int, exclude_admin: bool = Tr
     if not GA_PROPERTY_ID:
         raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
     
-    client = get_ga_client()
     start_date, end_date = get_date_range(days)
     
     request_params = {
         "property": f"properties/{GA_PROPERTY_ID}",
         "date_ranges": [DateRange(start_date=start_date, end_date=end_date)],
         "metrics": [Metric(name=m) for m in metrics],
+        "return_property_quota": True,
     }
     
     # Add filter to exclude admin and login pages
@@ -207,25 +471,96 @@ def run_aggregate_report(metrics: List[str], days: int, exclude_admin: bool = Tr
             )
         )
     
-    try:
-        request = RunReportRequest(**request_params)
-        response = client.run_report(request)
+    request = RunReportRequest(**request_params)
+    
+    async def fetch() -> Dict[str, Any]:
+        try:
+            response = await report_batcher.submit(request)
+            table = ReportTable.from_response(response, [], metrics)
+            
+            return {met: table[met][0] if len(table) else 0 for met in metrics}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"GA4 API error: {str(e)}")
+    
+    key = report_cache_key("aggregate", request)
+    factor = quota_governor.ttl_factor("core")
+    return await report_cache.get_or_fetch(
+        key,
+        lambda: flights.do(key, fetch),
+        ttl=cache_ttl * factor * window_factor(days),
+        stale_ttl=REPORT_CACHE_STALE * factor,
+        stale_if_error=True
+    )
+
+
+async def run_daily_report(dimensions: List[str], metrics: List[str], days: int) -> ReportTable:
+    """
+    Run a report that includes the "date" dimension, reusing stored days.
+    Days older than REPORT_STORE_MUTABLE_DAYS are final in GA4 and are read
+    from report_store; only missing or still-changing days are fetched.
+    The assembled table is cached like run_report's, so the still-changing
+    days are only re-fetched once it expires. Rows are returned sorted by date.
+    """
+    if "date" not in dimensions:
+        raise ValueError("run_daily_report requires the 'date' dimension")
+    if not GA_PROPERTY_ID:
+        raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
+    
+    start_date, end_date = get_date_range(days)
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    mutable_from = end - timedelta(days=REPORT_STORE_MUTABLE_DAYS)
+    all_days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    dataset = dataset_key(dimensions, metrics)
+    
+    async def assemble() -> ReportTable:
+        # SQLite and JSON decoding stay off the event loop
+        stored = await asyncio.to_thread(report_store.get_days, GA_PROPERTY_ID, dataset, start_date, end_date)
+        missing = [d for d in all_days if d not in stored or d >= mutable_from.isoformat()]
         
-        result = {}
-        if response.rows:
-            for i, met in enumerate(metrics):
-                value = response.rows[0].metric_values[i].value
-                try:
-                    result[met] = float(value) if '.' in value else int(value)
-                except:
-                    result[met] = value
-        else:
-            for met in metrics:
-                result[met] = 0
+        # Contiguous runs of missing days, fetched concurrently (and batched upstream)
+        runs = contiguous_runs(missing)
         
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"GA4 API error: {str(e)}")
+        fetched_runs = await asyncio.gather(*(
+            run_report(
+                dimensions=dimensions,
+                metrics=metrics,
+                days=days,
+                limit=GA_MAX_ROWS,
+                date_range=(run[0], run[-1])
+            )
+            for run in runs
+        ))
+        
+        by_day: Dict[str, List[Dict[str, Any]]] = {d: [] for d in missing}
+        for fetched in fetched_runs:
+            for row in fetched.records():
+                raw = row["date"]  # YYYYMMDD
+                by_day.setdefault(f"{raw[:4]}-{raw[4:6]}-{raw[6:8]}", []).append(row)
+        
+        await asyncio.to_thread(
+            report_store.put_days,
+            GA_PROPERTY_ID,
+            dataset,
+            {d: rows for d, rows in by_day.items() if d < mutable_from.isoformat()}
+        )
+        stored.update(by_day)
+        
+        return ReportTable.from_records(
+            (row for d in all_days for row in stored.get(d, [])), dimensions, metrics
+        )
+    
+    key = ("daily", GA_PROPERTY_ID, dataset, start_date, end_date)
+    factor = quota_governor.ttl_factor("core")
+    return await report_cache.get_or_fetch(
+        key,
+        lambda: flights.do(key, assemble),
+        ttl=REPORT_CACHE_TTL * factor * window_factor(days),
+        stale_ttl=REPORT_CACHE_STALE * factor,
+        stale_if_error=True
+    )
 
 
 # ============ Response Models ============
@@ -263,6 +598,21 @@ async def root():
     return {"status": "ok", "service": "GA4 Analytics API", "version": "1.0.0"}
 
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Report cache hit/miss counters."""
+    return {
+        "reports": report_cache.stats(),
+        "store": report_store.stats(),
+        "seoWarehouse": seo_warehouse.stats(),
+        "upstream": flights.stats(),
+        "batching": report_batcher.stats(),
+        "rendering": render_cache.stats(),
+        "realtimeStream": realtime_broadcaster.stats(),
+        "quota": quota_governor.status(),
+    }
+
+
 @app.get("/api/stats", response_model=StatsResponse)
 async def get_stats(days: int = Query(default=7, ge=1, le=365)):
     """
@@ -276,16 +626,17 @@ async def get_stats(days: int = Query(default=7, ge=1, le=365)):
         "sessions"
     ]
     
-    result = run_aggregate_report(metrics, days)
+    result = await run_aggregate_report(metrics, days)
     
-    return {
+    # Rebuilt only when the cached report changes, so its rendered body is reused
+    return payload_cache.get(("stats", days), result, lambda: {
         "visitors": result.get("activeUsers", 0),
         "pageviews": result.get("screenPageViews", 0),
         "bounceRate": round(result.get("bounceRate", 0) * 100, 2),  # Convert to percentage
         "avgSessionDuration": round(result.get("averageSessionDuration", 0), 1),
         "sessions": result.get("sessions", 0),
         "period": f"{days}d"
-    }
+    })
 
 
 @app.get("/api/leads")
@@ -306,14 +657,15 @@ async def get_leads(days: int = Query(default=28, ge=1, le=365)):
         )
     )
     
-    results = run_report(
+    results = await run_report(
         dimensions=["eventName"],
         metrics=["eventCount"],
         days=days,
-        dimension_filter=dimension_filter
+        dimension_filter=dimension_filter,
+        cache_ttl=300  # Leads are watched closely, keep them fresher
     )
     
-    total_leads = sum(r.get("eventCount", 0) for r in results)
+    total_leads = sum(results["eventCount"])
     
     return {"leads": total_leads, "period": f"{days}d"}
 
@@ -321,29 +673,20 @@ async def get_leads(days: int = Query(default=28, ge=1, le=365)):
 @app.get("/api/pageviews-series")
 async def get_pageviews_series(days: int = Query(default=7, ge=1, le=365)):
     """Get time-series data for pageviews and sessions chart."""
-    results = run_report(
+    # Sorted by date; finalized days come from the local report store
+    results = await run_daily_report(
         dimensions=["date"],
         metrics=["screenPageViews", "sessions"],
-        days=days,
-        limit=365
+        days=days
     )
     
-    # Sort by date
-    results.sort(key=lambda x: x.get("date", ""))
-    
-    pageviews = []
-    sessions = []
-    
-    for r in results:
-        date_str = r.get("date", "")
-        # Format date from YYYYMMDD to YYYY-MM-DD
-        if len(date_str) == 8:
-            formatted_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
-        else:
-            formatted_date = date_str
-        
-        pageviews.append({"x": formatted_date, "y": r.get("screenPageViews", 0)})
-        sessions.append({"x": formatted_date, "y": r.get("sessions", 0)})
+    # Format dates from YYYYMMDD to YYYY-MM-DD
+    dates = [
+        f"{d[:4]}-{d[4:6]}-{d[6:8]}" if len(d) == 8 else d
+        for d in results["date"]
+    ]
+    pageviews = [{"x": x, "y": y} for x, y in zip(dates, results["screenPageViews"])]
+    sessions = [{"x": x, "y": y} for x, y in zip(dates, results["sessions"])]
     
     return {
         "pageviews": pageviews,
@@ -357,7 +700,7 @@ async def get_top_pages(days: int = Query(default=7, ge=1, le=365), limit: int =
     """Get top pages by pageviews."""
     from google.analytics.data_v1beta.types import OrderBy
     
-    results = run_report(
+    results = await run_report(
         dimensions=["pagePath"],
         metrics=["screenPageViews", "activeUsers", "bounceRate", "averageSessionDuration"],
         days=days,
@@ -366,15 +709,22 @@ async def get_top_pages(days: int = Query(default=7, ge=1, le=365), limit: int =
     )
     
     # Format for frontend compatibility
-    pages = []
-    for r in results:
-        pages.append({
-            "x": r.get("pagePath", "/"),
-            "y": r.get("screenPageViews", 0),
-            "visitors": r.get("activeUsers", 0),
-            "bounceRate": round(r.get("bounceRate", 0) * 100, 1),
-            "avgTime": round(r.get("averageSessionDuration", 0), 1)
-        })
+    pages = [
+        {
+            "x": path,
+            "y": views,
+            "visitors": users,
+            "bounceRate": round(bounce * 100, 1),
+            "avgTime": round(duration, 1)
+        }
+        for path, views, users, bounce, duration in zip(
+            results["pagePath"],
+            results["screenPageViews"],
+            results["activeUsers"],
+            results["bounceRate"],
+            results["averageSessionDuration"]
+        )
+    ]
     
     return {"pages": pages, "period": f"{days}d"}
 
@@ -382,13 +732,13 @@ async def get_top_pages(days: int = Query(default=7, ge=1, le=365), limit: int =
 @app.get("/api/devices")
 async def get_devices(days: int = Query(default=7, ge=1, le=365)):
     """Get device category breakdown."""
-    results = run_report(
+    results = await run_report(
         dimensions=["deviceCategory"],
         metrics=["activeUsers"],
         days=days
     )
     
-    devices = [{"x": r.get("deviceCategory", "unknown"), "y": r.get("activeUsers", 0)} for r in results]
+    devices = [{"x": x, "y": y} for x, y in zip(results["deviceCategory"], results["activeUsers"])]
     
     return {"devices": devices, "period": f"{days}d"}
 
@@ -396,19 +746,17 @@ async def get_devices(days: int = Query(default=7, ge=1, le=365)):
 @app.get("/api/channels")
 async def get_channels(days: int = Query(default=7, ge=1, le=365)):
     """Get traffic channels breakdown."""
-    results = run_report(
+    results = await run_report(
         dimensions=["sessionDefaultChannelGroup"],
         metrics=["sessions", "activeUsers"],
         days=days
     )
     
     channels = [
-        {
-            "x": r.get("sessionDefaultChannelGroup", "Direct"),
-            "y": r.get("sessions", 0),
-            "users": r.get("activeUsers", 0)
-        } 
-        for r in results
+        {"x": x, "y": y, "users": users}
+        for x, y, users in zip(
+            results["sessionDefaultChannelGroup"], results["sessions"], results["activeUsers"]
+        )
     ]
     
     return {"channels": channels, "period": f"{days}d"}
@@ -428,7 +776,7 @@ async def get_referrers(days: int = Query(default=7, ge=1, le=365), limit: int =
     ]
     
     # Request more results to account for filtered entries
-    results = run_report(
+    results = await run_report(
         dimensions=["sessionSource"],
         metrics=["sessions"],
         days=days,
@@ -438,12 +786,11 @@ async def get_referrers(days: int = Query(default=7, ge=1, le=365), limit: int =
     
     # Filter out debug domains
     referrers = []
-    for r in results:
-        source = r.get("sessionSource", "(direct)")
+    for source, sessions in zip(results["sessionSource"], results["sessions"]):
         # Skip debug domains
         if any(debug in source.lower() for debug in debug_domains):
             continue
-        referrers.append({"x": source, "y": r.get("sessions", 0)})
+        referrers.append({"x": source, "y": sessions})
     
     # Apply original limit after filtering
     referrers = referrers[:limit]
@@ -456,7 +803,7 @@ async def get_countries(days: int = Query(default=7, ge=1, le=365), limit: int =
     """Get visitors by country."""
     from google.analytics.data_v1beta.types import OrderBy
     
-    results = run_report(
+    results = await run_report(
         dimensions=["country"],
         metrics=["activeUsers"],
         days=days,
@@ -464,7 +811,7 @@ async def get_countries(days: int = Query(default=7, ge=1, le=365), limit: int =
         limit=limit
     )
     
-    countries = [{"x": r.get("country", "Unknown"), "y": r.get("activeUsers", 0)} for r in results]
+    countries = [{"x": x, "y": y} for x, y in zip(results["country"], results["activeUsers"])]
     
     return {"countries": countries, "period": f"{days}d"}
 
@@ -474,7 +821,7 @@ async def get_cities(days: int = Query(default=7, ge=1, le=365), limit: int = Qu
     """Get visitors by city with country info for flag display."""
     from google.analytics.data_v1beta.types import OrderBy
     
-    results = run_report(
+    results = await run_report(
         dimensions=["city", "country"],
         metrics=["activeUsers"],
         days=days,
@@ -482,11 +829,10 @@ async def get_cities(days: int = Query(default=7, ge=1, le=365), limit: int = Qu
         limit=limit
     )
     
-    cities = [{
-        "city": r.get("city", "Unknown"),
-        "country": r.get("country", "Unknown"),
-        "visitors": r.get("activeUsers", 0)
-    } for r in results]
+    cities = [
+        {"city": city, "country": country, "visitors": visitors}
+        for city, country, visitors in zip(results["city"], results["country"], results["activeUsers"])
+    ]
     
     return {"cities": cities, "period": f"{days}d"}
 
@@ -494,13 +840,13 @@ async def get_cities(days: int = Query(default=7, ge=1, le=365), limit: int = Qu
 @app.get("/api/browsers")
 async def get_browsers(days: int = Query(default=7, ge=1, le=365)):
     """Get browser breakdown."""
-    results = run_report(
+    results = await run_report(
         dimensions=["browser"],
         metrics=["activeUsers"],
         days=days
     )
     
-    browsers = [{"x": r.get("browser", "Unknown"), "y": r.get("activeUsers", 0)} for r in results]
+    browsers = [{"x": x, "y": y} for x, y in zip(results["browser"], results["activeUsers"])]
     
     return {"browsers": browsers, "period": f"{days}d"}
 
@@ -508,13 +854,13 @@ async def get_browsers(days: int = Query(default=7, ge=1, le=365)):
 @app.get("/api/operating-systems")
 async def get_operating_systems(days: int = Query(default=7, ge=1, le=365)):
     """Get operating system breakdown."""
-    results = run_report(
+    results = await run_report(
         dimensions=["operatingSystem"],
         metrics=["activeUsers"],
         days=days
     )
     
-    os_data = [{"x": r.get("operatingSystem", "Unknown"), "y": r.get("activeUsers", 0)} for r in results]
+    os_data = [{"x": x, "y": y} for x, y in zip(results["operatingSystem"], results["activeUsers"])]
     
     return {"operatingSystems": os_data, "period": f"{days}d"}
 
@@ -525,141 +871,133 @@ async def get_realtime():
     Get comprehensive realtime data.
     Includes: active users, pages, cities, devices, events, and traffic sources.
     """
+    if not GA_PROPERTY_ID:
+        raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
+    
+    # Check cache
+    if _realtime_cache and _realtime_cache_expiry and datetime.now() < _realtime_cache_expiry:
+        return _realtime_cache
+    
+    # On a cold cache, concurrent pollers share a single refresh
+    try:
+        return await flights.do("realtime", fetch_realtime)
+    except HTTPException as e:
+        # Realtime quota exhausted: an older snapshot beats an error
+        if e.status_code == 429 and _realtime_cache is not None:
+            return _realtime_cache
+        raise
+
+
+async def fetch_realtime() -> Dict[str, Any]:
+    """
+    Run the realtime queries concurrently and refresh the realtime cache.
+    A failed query only empties its own section (reported under "errors").
+    """
     from google.analytics.data_v1beta.types import (
         RunRealtimeReportRequest,
         Metric,
         Dimension,
     )
     
-    if not GA_PROPERTY_ID:
-        raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
+    global _realtime_cache, _realtime_cache_expiry
     
-    client = get_ga_client()
+    # section -> (dimensions, metric)
+    queries = {
+        "activeVisitors": ([], "activeUsers"),
+        "urls": (["unifiedScreenName"], "activeUsers"),
+        "countries": (["country"], "activeUsers"),
+        "cities": (["city", "country"], "activeUsers"),
+        "devices": (["deviceCategory"], "activeUsers"),
+        "events": (["eventName"], "eventCount"),
+        "minutesTrend": (["minutesAgo"], "activeUsers"),
+    }
+    semaphore = asyncio.Semaphore(REALTIME_MAX_CONCURRENCY)
     
-    # Check cache
-    global _realtime_cache, _realtime_cache_expiry
-    if _realtime_cache and _realtime_cache_expiry and datetime.now() < _realtime_cache_expiry:
-        return _realtime_cache
-
-    try:
-        # Get total active users
+    async def query(dimensions: List[str], metric: str):
         request = RunRealtimeReportRequest(
             property=f"properties/{GA_PROPERTY_ID}",
-            metrics=[Metric(name="activeUsers")],
-        )
-        response = client.run_realtime_report(request)
-        
-        active_users = 0
-        if response.rows:
-            active_users = int(response.rows[0].metric_values[0].value)
-        
-        # Get active users by page
-        request_pages = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="unifiedScreenName")],
-            metrics=[Metric(name="activeUsers")],
-        )
-        response_pages = client.run_realtime_report(request_pages)
-        
-        pages = {}
-        for row in response_pages.rows:
-            page = row.dimension_values[0].value
-            users = int(row.metric_values[0].value)
-            pages[page] = users
-        
-        # Get active users by country
-        request_countries = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="country")],
-            metrics=[Metric(name="activeUsers")],
-        )
-        response_countries = client.run_realtime_report(request_countries)
-        
-        countries = {}
-        for row in response_countries.rows:
-            country = row.dimension_values[0].value
-            users = int(row.metric_values[0].value)
-            countries[country] = users
-        
-        # Get active users by city (NEW)
-        request_cities = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="city"), Dimension(name="country")],
-            metrics=[Metric(name="activeUsers")],
+            dimensions=[Dimension(name=d) for d in dimensions],
+            metrics=[Metric(name=metric)],
+            return_property_quota=True,
         )
-        response_cities = client.run_realtime_report(request_cities)
-        
-        cities = []
-        for row in response_cities.rows:
-            city = row.dimension_values[0].value
-            country = row.dimension_values[1].value
-            users = int(row.metric_values[0].value)
-            cities.append({"city": city, "country": country, "users": users})
-        
-        # Get active users by device category (NEW)
-        request_devices = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="deviceCategory")],
-            metrics=[Metric(name="activeUsers")],
-        )
-        response_devices = client.run_realtime_report(request_devices)
-        
-        devices = {}
-        for row in response_devices.rows:
-            device = row.dimension_values[0].value
-            users = int(row.metric_values[0].value)
-            devices[device] = users
-        
-        # Get active events (NEW)
-        request_events = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="eventName")],
-            metrics=[Metric(name="eventCount")],
-        )
-        response_events = client.run_realtime_report(request_events)
-        
-        events = {}
-        for row in response_events.rows:
-            event = row.dimension_values[0].value
-            count = int(row.metric_values[0].value)
-            events[event] = count
-        
-        # Get traffic by minute (last 30 minutes) (NEW)
-        request_minutes = RunRealtimeReportRequest(
-            property=f"properties/{GA_PROPERTY_ID}",
-            dimensions=[Dimension(name="minutesAgo")],
-            metrics=[Metric(name="activeUsers")],
-        )
-        response_minutes = client.run_realtime_report(request_minutes)
-        
-        minutes_data = []
-        for row in response_minutes.rows:
-            minutes_ago = int(row.dimension_values[0].value)
-            users = int(row.metric_values[0].value)
-            minutes_data.append({"minutesAgo": minutes_ago, "users": users})
-        
-        # Sort by minutesAgo ascending
-        minutes_data.sort(key=lambda x: x["minutesAgo"])
-        
-        result = {
-            "activeVisitors": active_users,
-            "urls": pages,
-            "countries": countries,
-            "cities": cities,
-            "devices": devices,
-            "events": events,
-            "minutesTrend": minutes_data,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Update cache (30 seconds TTL)
-        _realtime_cache = result
-        _realtime_cache_expiry = datetime.now() + timedelta(seconds=30)
-        
-        return result
+        async with semaphore:
+            return await call_ga("run_realtime_report", request)
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Realtime API error: {str(e)}")
+    responses = await asyncio.gather(
+        *(query(dims, metric) for dims, metric in queries.values()),
+        return_exceptions=True
+    )
+    sections = dict(zip(queries.keys(), responses))
+    
+    errors = {
+        name: str(getattr(response, "detail", response))
+        for name, response in sections.items()
+        if isinstance(response, Exception)
+    }
+    if len(errors) == len(sections):
+        first = sections["activeVisitors"]
+        if isinstance(first, HTTPException) and first.status_code == 429:
+            raise first
+        raise HTTPException(status_code=500, detail=f"Realtime API error: {errors['activeVisitors']}")
+    
+    def table(name: str) -> ReportTable:
+        dimensions, metric = queries[name]
+        response = sections[name]
+        if isinstance(response, Exception):
+            return ReportTable.from_records([], dimensions, [metric])
+        return ReportTable.from_response(response, dimensions, [metric])
+    
+    # Get total active users
+    totals = table("activeVisitors")
+    active_users = totals["activeUsers"][0] if len(totals) else 0
+    
+    # Get active users by page, country, device category; events by name
+    urls = table("urls")
+    pages = dict(zip(urls["unifiedScreenName"], urls["activeUsers"]))
+    by_country = table("countries")
+    countries = dict(zip(by_country["country"], by_country["activeUsers"]))
+    by_device = table("devices")
+    devices = dict(zip(by_device["deviceCategory"], by_device["activeUsers"]))
+    by_event = table("events")
+    events = dict(zip(by_event["eventName"], by_event["eventCount"]))
+    
+    # Get active users by city
+    by_city = table("cities")
+    cities = [
+        {"city": city, "country": country, "users": users}
+        for city, country, users in zip(by_city["city"], by_city["country"], by_city["activeUsers"])
+    ]
+    
+    # Get traffic by minute (last 30 minutes), sorted by minutesAgo ascending
+    trend = table("minutesTrend")
+    minutes_data = sorted(
+        (
+            {"minutesAgo": int(minutes_ago), "users": users}
+            for minutes_ago, users in zip(trend["minutesAgo"], trend["activeUsers"])
+        ),
+        key=lambda x: x["minutesAgo"]
+    )
+    
+    result = {
+        "activeVisitors": active_users,
+        "urls": pages,
+        "countries": countries,
+        "cities": cities,
+        "devices": devices,
+        "events": events,
+        "minutesTrend": minutes_data,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    if errors:
+        result["errors"] = errors
+    
+    # Update cache (30 seconds TTL; retry degraded results sooner; longer as the quota drains)
+    _realtime_cache = result
+    ttl = (5 if errors else 30) * quota_governor.ttl_factor("realtime")
+    _realtime_cache_expiry = datetime.now() + timedelta(seconds=ttl)
+    
+    return result
 
 
 @app.get("/api/events")
@@ -667,7 +1005,7 @@ async def get_events(days: int = Query(default=7, ge=1, le=365)):
     """Get custom events breakdown."""
     from google.analytics.data_v1beta.types import OrderBy
     
-    results = run_report(
+    results = await run_report(
         dimensions=["eventName"],
         metrics=["eventCount"],
         days=days,
@@ -675,7 +1013,7 @@ async def get_events(days: int = Query(default=7, ge=1, le=365)):
         limit=20
     )
     
-    events = [{"x": r.get("eventName", "unknown"), "y": r.get("eventCount", 0)} for r in results]
+    events = [{"x": x, "y": y} for x, y in zip(results["eventName"], results["eventCount"])]
     
     return {"events": events, "period": f"{days}d"}
 
@@ -685,7 +1023,7 @@ async def get_landing_pages(days: int = Query(default=7, ge=1, le=365), limit: i
     """Get entry/landing pages."""
     from google.analytics.data_v1beta.types import OrderBy
     
-    results = run_report(
+    results = await run_report(
         dimensions=["landingPage"],
         metrics=["sessions", "bounceRate"],
         days=days,
@@ -694,12 +1032,8 @@ async def get_landing_pages(days: int = Query(default=7, ge=1, le=365), limit: i
     )
     
     pages = [
-        {
-            "x": r.get("landingPage", "/"),
-            "y": r.get("sessions", 0),
-            "bounceRate": round(r.get("bounceRate", 0) * 100, 1)
-        }
-        for r in results
+        {"x": x, "y": y, "bounceRate": round(bounce * 100, 1)}
+        for x, y, bounce in zip(results["landingPage"], results["sessions"], results["bounceRate"])
     ]
     
     return {"landingPages": pages, "period": f"{days}d"}
@@ -712,7 +1046,7 @@ async def get_exit_pages(days: int = Query(default=7, ge=1, le=365), limit: int
     
     # GA4 doesn't have a direct "exitPage" dimension like UA
     # We use pagePath + exits metric as approximation
-    results = run_report(
+    results = await run_report(
         dimensions=["pagePath"],
         metrics=["sessions"],  # Using sessions as proxy, exits not directly available in Data API
         days=days,
@@ -720,65 +1054,53 @@ async def get_exit_pages(days: int = Query(default=7, ge=1, le=365), limit: int
         limit=limit
     )
     
-    pages = [{"x": r.get("pagePath", "/"), "y": r.get("sessions", 0)} for r in results]
+    pages = [{"x": x, "y": y} for x, y in zip(results["pagePath"], results["sessions"])]
     
     return {"exitPages": pages, "period": f"{days}d"}
 
 
-# ============ Geocoding ============
+# ============ Realtime Stream ============
 
-import httpx
-from functools import lru_cache
+from broadcast import Broadcaster
 
-# In-memory cache for geocoding results (persists during app runtime)
-# In-memory cache for geocoding results (persists during app runtime)
-CACHE_FILE = "geocoding_cache.json"
+# One poller shared by every /api/realtime/stream subscriber
+realtime_broadcaster = Broadcaster(get_realtime, interval=REALTIME_STREAM_INTERVAL)
 
-def load_cache() -> Dict[str, Optional[Dict[str, float]]]:
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading cache: {e}")
-    return {}
 
-def save_cache(cache: Dict[str, Optional[Dict[str, float]]]):
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, indent=2)
-    except Exception as e:
-        print(f"Error saving cache: {e}")
+@app.get("/api/realtime/stream")
+async def stream_realtime():
+    """
+    Server-Sent Events with realtime data: a "snapshot" event on connect,
+    then "patch" events (JSON merge patches) whenever the data changes.
+    Polling runs only while someone is subscribed, once for all of them.
+    """
+    if not GA_PROPERTY_ID:
+        raise HTTPException(status_code=500, detail="GA_PROPERTY_ID not configured")
+    
+    async def generate():
+        # Reconnect quickly if the connection drops (EventSource default is ~3s)
+        yield "retry: 5000\n\n"
+        async for event, data in realtime_broadcaster.subscribe():
+            if event == "heartbeat":
+                yield ": keepalive\n\n"
+                continue
+            # The same snapshot/patch object goes to every subscriber: encode it once
+            body, _ = render_cache.render(data)
+            yield f"event: {event}\ndata: {body.decode()}\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-geocoding_cache: Dict[str, Optional[Dict[str, float]]] = load_cache()
 
-@lru_cache(maxsize=1000)
-def geocode_city_cached(city: str, country: str) -> Optional[Dict[str, float]]:
-    """Geocode a city using OpenStreetMap Nominatim API."""
-    try:
-        query = f"{city}, {country}" if country else city
-        response = httpx.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={
-                "q": query,
-                "format": "json",
-                "limit": 1,
-            },
-            headers={"User-Agent": "PAI-Dental-Analytics/1.0 (ferramenta interna de analise)"},
-            timeout=5.0,
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        if data and len(data) > 0:
-            return {
-                "lat": float(data[0]["lat"]),
-                "lng": float(data[0]["lon"]),
-            }
-        return None
-    except Exception as e:
-        print(f"Geocoding error for {city}: {e}")
-        return None
+# ============ Geocoding ============
+
+import geocoding
+
+# How long /api/geocode-cities waits for uncached cities before answering
+GEOCODE_WAIT_SECONDS = float(os.getenv("GEOCODE_WAIT_SECONDS", "2"))
 
 
 class GeocodeBatchRequest(BaseModel):
@@ -793,61 +1115,105 @@ class GeocodedCity(BaseModel):
     users: int = 0
 
 
+def geocoded_city(item: Dict[str, Any], coords) -> Dict[str, Any]:
+    return {
+        "city": item["city"],
+        "country": item["country"],
+        "lat": coords["lat"],
+        "lng": coords["lng"],
+        "users": item["users"],
+    }
+
+
 @app.post("/api/geocode-cities")
-async def geocode_cities(request: GeocodeBatchRequest):
-    """Batch geocode cities for map display."""
+async def geocode_cities(
+    request: GeocodeBatchRequest,
+    stream: bool = Query(default=False, description="Stream cities as NDJSON as they resolve")
+):
+    """
+    Batch geocode cities for map display.
+    Cities in the offline gazetteer or the geocode store are returned immediately. Uncached ones are geocoded in the
+    background (rate-limited); those not resolved within GEOCODE_WAIT_SECONDS
+    are counted in "pending" and show up on a later request.
+    """
     results = []
+    lookups = {}
     
     for item in request.cities:
         city = item.get("city", "")
         country = item.get("country", "")
-        users = item.get("users", 0)
+        item = {"city": city, "country": country, "users": item.get("users", 0)}
         
         # Skip invalid cities
         if not city or city == "(not set)":
             continue
         
         # Check cache first
-        cache_key = f"{city}|{country}"
-        if cache_key in geocoding_cache:
-            coords = geocoding_cache[cache_key]
+        found, coords = geocoding.lookup_local(city, country)
+        if found:
+            if coords:
+                results.append(geocoded_city(item, coords))
         else:
-            # Geocode and cache
-            coords = geocode_city_cached(city, country)
-            geocoding_cache[cache_key] = coords
-            # Save updated cache
-            save_cache(geocoding_cache)
+            task = asyncio.ensure_future(geocoding.resolve(city, country))
+            lookups[task] = item
+    
+    if stream:
+        async def generate():
+            for result in results:
+                yield json.dumps(result) + "\n"
+            pending = set(lookups)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    coords = task.result()
+                    if coords:
+                        yield json.dumps(geocoded_city(lookups[task], coords)) + "\n"
         
-        if coords:
-            results.append({
-                "city": city,
-                "country": country,
-                "lat": coords["lat"],
-                "lng": coords["lng"],
-                "users": users,
-            })
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
     
-    return {"cities": results}
-
-
-# ============ Run Server ============
+    pending = set()
+    if lookups:
+        done, pending = await asyncio.wait(lookups, timeout=GEOCODE_WAIT_SECONDS)
+        for task in done:
+            coords = task.result()
+            if coords:
+                results.append(geocoded_city(lookups[task], coords))
+    
+    return {"cities": results, "pending": len(pending)}
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
 
 # ============ GSC Endpoints ============
 
 import gsc
 
+
+async def fetch_search_analytics(
+    start_date: str,
+    end_date: str,
+    dimensions: List[str] = None,
+    row_limit: int = 1000
+) -> List[Dict[str, Any]]:
+    """gsc.fetch_search_analytics, cached (see SEO_CACHE_TTL) and coalescing identical concurrent queries."""
+    key = ("gsc", start_date, end_date, tuple(dimensions or []), row_limit)
+    return await report_cache.get_or_fetch(
+        key,
+        lambda: flights.do(key, lambda: gsc.fetch_search_analytics(
+            start_date, end_date, dimensions=dimensions, row_limit=row_limit
+        )),
+        ttl=SEO_CACHE_TTL,
+        stale_ttl=SEO_CACHE_STALE,
+        stale_if_error=True
+    )
+
+
 @app.get("/api/seo/overview")
 async def get_seo_overview(days: int = Query(default=28, ge=1, le=90)):
     """Get GSC overview metrics (Clicks, Impressions, CTR, Position)."""
     start_str, end_str = gsc.get_date_range(days)
     
-    # 1. Get Totals (no dimensions)
+    # Time series (dimension = date); totals are derived from it below
     try:
-        totals_rows = gsc.fetch_search_analytics(start_str, end_str, dimensions=[])
+        date_rows = await fetch_search_analytics(start_str, end_str, dimensions=['date'])
     except HTTPException:
         # If GSC is not configured, return empty stats gracefully or bubble up error
         # For the dashboard we might want to fail gracefully if just not configured
@@ -855,11 +1221,6 @@ async def get_seo_overview(days: int = Query(default=28, ge=1, le=90)):
             "clicks": 0, "impressions": 0, "ctr": 0, "position": 0, 
             "history": [], "period": f"{days}d", "status": "not_configured"
         }
-        
-    totals = totals_rows[0] if totals_rows else {"clicks": 0, "impressions": 0, "ctr": 0, "position": 0}
-
-    # 2. Get Time Series (dimension = date)
-    date_rows = gsc.fetch_search_analytics(start_str, end_str, dimensions=['date'])
     
     history = []
     for row in date_rows:
@@ -873,12 +1234,19 @@ async def get_seo_overview(days: int = Query(default=28, ge=1, le=90)):
     
     # Sort history by date
     history.sort(key=lambda x: x['date'])
+    
+    # Totals: clicks and impressions add up; CTR and position are
+    # impression-weighted, matching what GSC reports for the whole range
+    clicks = sum(h['clicks'] for h in history)
+    impressions = sum(h['impressions'] for h in history)
+    ctr = clicks / impressions if impressions else 0
+    position = sum(h['position'] * h['impressions'] for h in history) / impressions if impressions else 0
 
     return {
-        "clicks": totals.get('clicks', 0),
-        "impressions": totals.get('impressions', 0),
-        "ctr": round(totals.get('ctr', 0) * 100, 2), # %
-        "position": round(totals.get('position', 0), 1),
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": round(ctr * 100, 2), # %
+        "position": round(position, 1),
         "history": history,
         "period": f"{days}d",
         "status": "ok"
@@ -888,7 +1256,7 @@ async def get_seo_overview(days: int = Query(default=28, ge=1, le=90)):
 async def get_seo_queries(days: int = Query(default=28), limit: int = 20):
     """Get top search queries."""
     start_str, end_str = gsc.get_date_range(days)
-    rows = gsc.fetch_search_analytics(start_str, end_str, dimensions=['query'], row_limit=limit)
+    rows = await fetch_search_analytics(start_str, end_str, dimensions=['query'], row_limit=limit)
     
     results = []
     for row in rows:
@@ -906,7 +1274,7 @@ async def get_seo_queries(days: int = Query(default=28), limit: int = 20):
 async def get_seo_pages(days: int = Query(default=28), limit: int = 20):
     """Get top performing pages."""
     start_str, end_str = gsc.get_date_range(days)
-    rows = gsc.fetch_search_analytics(start_str, end_str, dimensions=['page'], row_limit=limit)
+    rows = await fetch_search_analytics(start_str, end_str, dimensions=['page'], row_limit=limit)
     
     results = []
     for row in rows:
@@ -920,10 +1288,85 @@ async def get_seo_pages(days: int = Query(default=28), limit: int = 20):
         
     return {"pages": results, "period": f"{days}d"}
 
+# Search Analytics dimensions accepted by the export
+SEO_EXPORT_DIMENSIONS = {"query", "page", "date", "country", "device", "searchAppearance"}
+SEO_EXPORT_METRICS = ["clicks", "impressions", "ctr", "position"]
+
+
+@app.get("/api/seo/export")
+async def export_seo_rows(
+    days: int = Query(default=28, ge=1, le=480),
+    dimensions: str = Query(default="query,page", description="Comma-separated GSC dimensions"),
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    max_rows: Optional[int] = Query(default=None, ge=1)
+):
+    """
+    Stream the full Search Analytics dataset (beyond the 1000-row endpoints).
+    Pages of up to 25k rows are fetched with startRow paging and written out
+    as they arrive, so memory stays flat regardless of the export size.
+    """
+    dims = [d.strip() for d in dimensions.split(",") if d.strip()]
+    unknown = [d for d in dims if d not in SEO_EXPORT_DIMENSIONS]
+    if not dims or unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid dimensions: {', '.join(unknown) or dimensions}")
+    
+    start_str, end_str = gsc.get_date_range(days)
+    pages = gsc.iter_search_analytics(start_str, end_str, dimensions=dims, max_rows=max_rows)
+    # Fail before the response starts (e.g. GSC not configured)
+    try:
+        with timing.phase("upstream"):
+            first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = []
+    
+    def flatten(row: Dict[str, Any]) -> Dict[str, Any]:
+        item = dict(zip(dims, row['keys']))
+        for metric in SEO_EXPORT_METRICS:
+            item[metric] = row[metric]
+        return item
+    
+    async def generate():
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=dims + SEO_EXPORT_METRICS)
+            writer.writeheader()
+        
+        page = first_page
+        try:
+            while True:
+                if format == "csv":
+                    writer.writerows(flatten(row) for row in page)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    yield "".join(json.dumps(flatten(row)) + "\n" for row in page)
+                try:
+                    page = await pages.__anext__()
+                except StopAsyncIteration:
+                    break
+        finally:
+            # On a client disconnect this cancels the prefetched page
+            await pages.aclose()
+    
+    filename = f"gsc-{'-'.join(dims)}-{start_str}-{end_str}.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @app.get("/api/seo/sitemaps")
 async def get_seo_sitemaps():
     """Get sitemaps status."""
-    sitemaps = gsc.get_sitemaps_status()
+    sitemaps = await report_cache.get_or_fetch(
+        "gsc-sitemaps",
+        lambda: flights.do("gsc-sitemaps", gsc.get_sitemaps_status),
+        ttl=SEO_CACHE_TTL,
+        stale_ttl=SEO_CACHE_STALE,
+        stale_if_error=True
+    )
     # simplify for frontend
     results = []
     for s in sitemaps:
@@ -937,3 +1380,449 @@ async def get_seo_sitemaps():
             "warnings": s.get('warnings')
         })
     return {"sitemaps": results}
+
+
+# ============ SEO Warehouse ============
+
+from seo_warehouse import SeoWarehouse
+
+seo_warehouse = SeoWarehouse()
+_seo_sync_lock: Optional[asyncio.Lock] = None
+# Days fetched per Search Analytics pass during a sync, to bound memory
+SEO_WAREHOUSE_CHUNK_DAYS = 7
+
+
+def seo_periods(days: int) -> tuple:
+    """(current, previous) date ranges of `days` days each, ending at the latest GSC day."""
+    _, end_str = gsc.get_date_range(0)
+    end = datetime.strptime(end_str, "%Y-%m-%d").date()
+    cur_start = end - timedelta(days=days - 1)
+    prev_end = cur_start - timedelta(days=1)
+    prev_start = prev_end - timedelta(days=days - 1)
+    return (
+        (cur_start.isoformat(), end.isoformat()),
+        (prev_start.isoformat(), prev_end.isoformat()),
+    )
+
+
+async def sync_seo_warehouse(days: int = SEO_WAREHOUSE_DAYS, refresh_recent: bool = True) -> int:
+    """
+    Bring the last `days` days of query x page rows into the warehouse.
+    Days in the last SEO_WAREHOUSE_MUTABLE_DAYS, which GSC may still revise,
+    are stored as provisional. Only days never synced are fetched, plus
+    provisional days that have since settled and (with `refresh_recent`)
+    provisional days still in the window. Returns the number of days fetched.
+    """
+    global _seo_sync_lock
+    if _seo_sync_lock is None:
+        _seo_sync_lock = asyncio.Lock()
+    
+    start_str, end_str = gsc.get_date_range(days - 1)
+    site = gsc.GSC_PROPERTY_URL
+    start = datetime.strptime(start_str, "%Y-%m-%d").date()
+    end = datetime.strptime(end_str, "%Y-%m-%d").date()
+    mutable_from = (end - timedelta(days=SEO_WAREHOUSE_MUTABLE_DAYS - 1)).isoformat()
+    all_days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    
+    def stale(days: List[str], synced: Dict[str, bool]) -> List[str]:
+        return [
+            d for d in days
+            if d not in synced or (not synced[d] and (refresh_recent or d < mutable_from))
+        ]
+    
+    gsc.site_path()  # fail fast if GSC is not configured
+    fetched = 0
+    with timing.phase("upstream"):
+        missing = stale(all_days, seo_warehouse.synced_days(site, start_str, end_str))
+        for run in contiguous_runs(missing):
+            for i in range(0, len(run), SEO_WAREHOUSE_CHUNK_DAYS):
+                chunk = run[i:i + SEO_WAREHOUSE_CHUNK_DAYS]
+                # Locked per chunk, so a request syncing its recent days is not held
+                # behind a whole backfill; concurrent callers wait for the chunk in
+                # progress, then find it synced
+                async with _seo_sync_lock:
+                    if not stale(chunk, seo_warehouse.synced_days(site, chunk[0], chunk[-1])):
+                        continue
+                    by_day: Dict[str, List[Dict[str, Any]]] = {d: [] for d in chunk}
+                    async for page in gsc.iter_search_analytics(
+                        chunk[0], chunk[-1], dimensions=["date", "query", "page"]
+                    ):
+                        for row in page:
+                            by_day.setdefault(row["keys"][0], []).append(row)
+                    await asyncio.to_thread(seo_warehouse.replace_days, site, by_day, mutable_from)
+                    fetched += len(chunk)
+    
+    return fetched
+
+
+async def sync_seo_request(days: int, start: str) -> str:
+    """
+    Inline sync before a request reads the warehouse from `start` to the latest
+    GSC day. Only the most recent days of its `days`-day window are fetched (at
+    most SEO_WAREHOUSE_INLINE_DAYS); the backfill of older days is left to the
+    gsc:warehouse refresh job. Returns "partial" while days since `start` are
+    still missing, "ok" otherwise.
+    """
+    await sync_seo_warehouse(min(days, SEO_WAREHOUSE_INLINE_DAYS), refresh_recent=False)
+    _, end = gsc.get_date_range(0)
+    synced = seo_warehouse.synced_days(gsc.GSC_PROPERTY_URL, start, end)
+    expected = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+    return "ok" if len(synced) >= expected else "partial"
+
+
+@app.get("/api/seo/movers")
+async def get_seo_movers(
+    days: int = Query(default=7, ge=1, le=90),
+    dimension: str = Query(default="query", pattern="^(query|page)$"),
+    by: str = Query(default="clicks", pattern="^(clicks|impressions|position)$"),
+    min_impressions: int = Query(default=10, ge=0),
+    limit: int = Query(default=20, ge=1, le=200)
+):
+    """
+    Queries (or pages) with the largest change between the last `days` days
+    and the `days` before, answered from the local warehouse.
+    """
+    current, previous = seo_periods(days)
+    status = await sync_seo_request(days, previous[0])
+    movers = seo_warehouse.movers(
+        gsc.GSC_PROPERTY_URL, dimension, current, previous,
+        by=by, min_impressions=min_impressions, limit=limit
+    )
+    return {
+        "movers": movers,
+        "current": {"start": current[0], "end": current[1]},
+        "previous": {"start": previous[0], "end": previous[1]},
+        "period": f"{days}d",
+        "status": status
+    }
+
+
+@app.get("/api/seo/query-history")
+async def get_seo_query_history(
+    query: str = Query(..., min_length=1),
+    days: int = Query(default=90, ge=1, le=480)
+):
+    """Daily clicks, impressions, CTR and position of one query, with the pages it ranks with."""
+    current, _ = seo_periods(days)
+    status = await sync_seo_request(days, current[0])
+    history = seo_warehouse.history(gsc.GSC_PROPERTY_URL, "query", query, *current)
+    return {**history, "period": f"{days}d", "status": status}
+
+
+@app.get("/api/seo/page-history")
+async def get_seo_page_history(
+    page: str = Query(..., min_length=1),
+    days: int = Query(default=90, ge=1, le=480)
+):
+    """Daily clicks, impressions, CTR and position of one page, with the queries it ranks for."""
+    current, _ = seo_periods(days)
+    status = await sync_seo_request(days, current[0])
+    history = seo_warehouse.history(gsc.GSC_PROPERTY_URL, "page", page, *current)
+    return {**history, "period": f"{days}d", "status": status}
+
+
+@app.get("/api/seo/cannibalization")
+async def get_seo_cannibalization(
+    days: int = Query(default=28, ge=1, le=480),
+    min_impressions: int = Query(default=10, ge=1),
+    limit: int = Query(default=20, ge=1, le=200)
+):
+    """Queries for which several pages compete (each with at least `min_impressions`)."""
+    current, _ = seo_periods(days)
+    status = await sync_seo_request(days, current[0])
+    queries = seo_warehouse.cannibalization(
+        gsc.GSC_PROPERTY_URL, *current, min_impressions=min_impressions, limit=limit
+    )
+    return {"queries": queries, "period": f"{days}d", "status": status}
+
+
+# ============ Composite Dashboard ============
+
+# Section name -> coroutine producing the same payload as its /api/* endpoint
+DASHBOARD_SECTIONS = {
+    "stats": lambda days: get_stats(days=days),
+    "pageviews-series": lambda days: get_pageviews_series(days=days),
+    "top-pages": lambda days: get_top_pages(days=days, limit=10),
+    "devices": lambda days: get_devices(days=days),
+    "channels": lambda days: get_channels(days=days),
+    "referrers": lambda days: get_referrers(days=days, limit=15),
+    "countries": lambda days: get_countries(days=days, limit=20),
+    "cities": lambda days: get_cities(days=days, limit=20),
+    "browsers": lambda days: get_browsers(days=days),
+    "operating-systems": lambda days: get_operating_systems(days=days),
+    "events": lambda days: get_events(days=days),
+    "landing-pages": lambda days: get_landing_pages(days=days, limit=10),
+    "exit-pages": lambda days: get_exit_pages(days=days, limit=10),
+    "leads": lambda days: get_leads(days=days),
+    "realtime": lambda days: get_realtime(),
+    "seo-overview": lambda days: get_seo_overview(days=min(days, 90)),
+    "seo-queries": lambda days: get_seo_queries(days=days, limit=20),
+    "seo-pages": lambda days: get_seo_pages(days=days, limit=20),
+    "seo-sitemaps": lambda days: get_seo_sitemaps(),
+}
+
+DEFAULT_DASHBOARD_SECTIONS = ["stats", "pageviews-series", "top-pages", "devices", "channels", "realtime"]
+
+
+async def run_dashboard_section(name: str, days: int):
+    """Run one dashboard section. Returns (name, data, error)."""
+    try:
+        return name, await DASHBOARD_SECTIONS[name](days), None
+    except HTTPException as e:
+        return name, None, str(e.detail)
+    except Exception as e:
+        return name, None, str(e)
+
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    sections: Optional[str] = Query(default=None, description="Comma-separated section names"),
+    days: int = Query(default=7, ge=1, le=365),
+    stream: bool = Query(default=False, description="Stream sections as NDJSON as they finish")
+):
+    """
+    Get several dashboard sections in one response.
+    Sections run concurrently and share the report cache and upstream batching;
+    a failed section is reported under "errors" without failing the others.
+    """
+    names = [n.strip() for n in sections.split(",") if n.strip()] if sections else DEFAULT_DASHBOARD_SECTIONS
+    unknown = [n for n in names if n not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    names = list(dict.fromkeys(names))
+    
+    tasks = [run_dashboard_section(name, days) for name in names]
+    
+    if stream:
+        async def generate():
+            for next_done in asyncio.as_completed(tasks):
+                name, data, error = await next_done
+                line = {"section": name, "data": data} if error is None else {"section": name, "error": error}
+                yield json.dumps(line) + "\n"
+        
+        # Sections may still fail after the headers are out, so never cache the stream
+        return StreamingResponse(
+            generate(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"}
+        )
+    
+    results = {}
+    errors = {}
+    for name, data, error in await asyncio.gather(*tasks):
+        if error is None:
+            results[name] = data
+        else:
+            errors[name] = error
+    
+    payload = {"sections": results, "errors": errors, "period": f"{days}d"}
+    if not errors and any(degraded(data) for data in results.values()):
+        # A section answered with a placeholder or partial data (e.g. realtime errors)
+        return FastJSONResponse(payload, headers={"Cache-Control": "no-store"})
+    return payload
+
+
+# ============ Background Refresh ============
+
+refresh_scheduler = RefreshScheduler(pace=REFRESH_PACE_SECONDS)
+
+# Historical sections kept warm, with the same arguments the frontend uses
+REFRESH_GA_SECTIONS = [
+    name for name in DASHBOARD_SECTIONS
+    if name != "realtime" and not name.startswith("seo-")
+]
+REFRESH_GSC_SECTIONS = ["seo-overview", "seo-queries", "seo-pages"]
+
+
+def register_refresh_jobs():
+    """
+    Schedule the frontend's windows for every historical section, longer
+    windows less often (window_factor). Jobs run twice per cache TTL and go
+    through the normal endpoint path under refresh_ahead: only reports that
+    are missing, stale or would expire before the next run are re-fetched
+    (daily reports still only fetch days the report store lacks), so each
+    costs one upstream call per TTL, and upstream errors fail the run.
+    """
+    if refresh_scheduler.jobs:
+        return
+    
+    # Background refreshes are the first GA4 work shed when the quota runs low
+    refresh_scheduler.should_run = lambda job: (
+        job.name.startswith("gsc:") or quota_governor.allow_background("core")
+    )
+    
+    def job(section: str, days: int, interval: float):
+        async def run():
+            with refresh_ahead(within=interval):
+                result = await DASHBOARD_SECTIONS[section](days)
+            # seo-overview answers with a placeholder instead of raising
+            if isinstance(result, dict) and result.get("status", "ok") != "ok":
+                raise RuntimeError(f"{section} returned status {result['status']!r}")
+        return run
+    
+    if GA_PROPERTY_ID:
+        for days in REFRESH_GA_WINDOWS:
+            for section in REFRESH_GA_SECTIONS:
+                interval = REFRESH_INTERVAL * window_factor(days)
+                refresh_scheduler.add(f"ga:{section}:{days}d", job(section, days, interval), interval)
+    
+    if gsc.GSC_PROPERTY_URL:
+        gsc_interval = SEO_CACHE_TTL / 2
+        for days in REFRESH_GSC_WINDOWS:
+            for section in REFRESH_GSC_SECTIONS:
+                refresh_scheduler.add(f"gsc:{section}:{days}d", job(section, days, gsc_interval), gsc_interval)
+        refresh_scheduler.add("gsc:seo-sitemaps", job("seo-sitemaps", 0, gsc_interval), gsc_interval)
+        refresh_scheduler.add("gsc:warehouse", sync_seo_warehouse, SEO_WAREHOUSE_SYNC_INTERVAL)
+
+
+@app.get("/api/refresh/status")
+async def get_refresh_status():
+    """Last refresh time and errors per background-refreshed dataset."""
+    return refresh_scheduler.status()
+
+
+# ============ Metrics ============
+
+# Counters the components already keep, read at scrape time
+metrics.collector(
+    "cache_lookups_total", "Cache lookups by cache and result.", "counter",
+    lambda: {
+        ("reports", "hit"): report_cache.hits,
+        ("reports", "stale"): report_cache.stale_hits,
+        ("reports", "miss"): report_cache.misses,
+        ("reports", "stale_on_error"): report_cache.stale_on_error,
+        ("reports", "refresh_ahead"): report_cache.refreshed_ahead,
+        ("render", "hit"): render_cache.hits,
+        ("render", "miss"): render_cache.misses,
+    },
+    labels=("cache", "result"),
+)
+metrics.collector(
+    "cache_evictions_total", "Entries evicted by the LRU bound.", "counter",
+    lambda: {("reports",): report_cache.evictions}, labels=("cache",),
+)
+metrics.collector(
+    "cache_refresh_errors_total", "Failed background revalidations.", "counter",
+    lambda: {("reports",): report_cache.refresh_errors}, labels=("cache",),
+)
+metrics.collector(
+    "cache_entries", "Entries currently cached.", "gauge",
+    lambda: {("reports",): len(report_cache)}, labels=("cache",),
+)
+metrics.collector(
+    "upstream_flights_in_flight", "Distinct upstream calls in flight (after coalescing).", "gauge",
+    lambda: {("reports",): len(flights), ("geocoding",): geocoding.pending_lookups()}, labels=("group",),
+)
+metrics.collector(
+    "upstream_coalesced_total", "Callers that joined an identical call already in flight.", "counter",
+    lambda: flights.shared,
+)
+metrics.collector("ga4_batches_total", "Report batches flushed by the micro-batcher.", "counter", lambda: report_batcher.batches)
+metrics.collector("ga4_batched_reports_total", "Reports sent through the batcher.", "counter", lambda: report_batcher.items)
+metrics.collector(
+    "ga4_quota_level", "Fraction of the tightest GA4 token budget left.", "gauge",
+    lambda: {(category,): quota_governor.level(category) for category in quota_governor.budgets},
+    labels=("category",),
+)
+metrics.collector("ga4_quota_rejected_total", "Calls refused while a quota was exhausted.", "counter", lambda: quota_governor.rejected)
+metrics.collector("ga4_background_shed_total", "Background refreshes skipped to save quota.", "counter", lambda: quota_governor.shed)
+metrics.collector("realtime_stream_subscribers", "Open realtime event streams.", "gauge", lambda: len(realtime_broadcaster))
+metrics.collector("realtime_stream_polls_total", "Realtime polls made for the stream.", "counter", lambda: realtime_broadcaster.polls)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ============ Profiling ============
+
+def require_admin(token: Optional[str]):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled (ADMIN_API_TOKEN not set)")
+    if not token or not secrets.compare_digest(token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    sampleRate: float = Field(default=0.1, gt=0, le=1)
+    path: Optional[str] = None  # only profile paths starting with this
+    duration: int = Field(default=600, ge=1, le=PROFILE_MAX_DURATION)  # seconds until it switches off
+
+
+@app.get("/api/admin/profiling")
+async def get_profiling(x_admin_token: Optional[str] = Header(default=None)):
+    """Profiler switch state and the most recent profiles."""
+    require_admin(x_admin_token)
+    return profiler.status()
+
+
+@app.post("/api/admin/profiling")
+async def set_profiling(settings: ProfilingSettings, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Turn sampling profiling on for a fraction of requests (optionally only
+    under `path`) for `duration` seconds, or off.
+    """
+    require_admin(x_admin_token)
+    profiler.configure(settings.enabled, settings.sampleRate, settings.path, settings.duration)
+    return profiler.status()
+
+
+@app.get("/api/admin/profiling/{name}")
+async def get_profile(name: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Download one profile (folded stacks, for flamegraph.pl or speedscope)."""
+    require_admin(x_admin_token)
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+# ============ Startup ============
+
+def warm_ga_client():
+    """
+    Build the GA4 client, connect its gRPC channel and fetch an access token,
+    so the first report does not pay for them (blocking; runs in the pool).
+    """
+    import grpc
+    import google.auth.transport.requests
+    
+    transport = getattr(get_ga_client(), "transport", None)
+    if transport is None:
+        return
+    grpc.channel_ready_future(transport.grpc_channel).result(timeout=warmup.timeout)
+    credentials = getattr(transport, "_credentials", None)
+    if credentials is not None and not credentials.valid:
+        credentials.refresh(google.auth.transport.requests.Request())
+
+
+async def warm_ga():
+    await upstream.run_blocking(warm_ga_client, timeout=warmup.timeout)
+
+
+if GA_PROPERTY_ID:
+    warmup.add("ga4", warm_ga)
+if gsc.GSC_PROPERTY_URL:
+    # Signs the JWT and exchanges it, opening the pooled HTTP client
+    warmup.add("gsc", gsc.get_access_token)
+warmup.add("geocoding", lambda: asyncio.to_thread(geocoding.warm))
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """
+    Readiness probe: 503 until startup warm-up has finished (see startup).
+    `/` stays the liveness check.
+    """
+    return FastJSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+
+warmup.import_seconds = round(time.perf_counter() - _import_started, 3)
+
+
+# ============ Run Server ============
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
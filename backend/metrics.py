@@ -0,0 +1,277 @@
+"""
+Prometheus metrics.
+Small, dependency-free counters, gauges and histograms rendered in the text
+exposition format (version 0.0.4) served at /metrics. Recording a sample is
+a dict lookup and a few additions, cheap enough for every upstream call;
+counters the app already keeps (cache hits, coalesced calls, quota) are read
+by collectors at scrape time instead of being recorded twice.
+Samples are recorded from the event loop only.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# Upstream round trips: tens of milliseconds (cached tokens) to the 30s deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+# (name suffix, label values, value)
+Sample = Tuple[str, LabelValues, float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def collect(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, value in self.collect():
+            names = self.labels + (("le",) if suffix == "_bucket" else ())
+            if names:
+                pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+                lines.append(f"{self.name}{suffix}{{{pairs}}} {_format_value(value)}")
+            else:
+                lines.append(f"{self.name}{suffix} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Iterable[Sample]:
+        for labels, value in self._values.items():
+            yield "", labels, value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def collect(self) -> Iterable[Sample]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels + (_format_value(bound),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Collector(Metric):
+    """
+    Metric read at scrape time. `read` returns the value, or a dict of
+    label values -> value for labelled metrics.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, labels: Sequence[str], read: Callable[[], object]):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.read = read
+
+    def collect(self) -> Iterable[Sample]:
+        values = self.read()
+        if not self.labels:
+            values = {(): values}
+        for labels, value in values.items():
+            yield "", labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing collector must not take the whole scrape down
+                print(f"Metric {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labels))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labels: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    return registry.register(Histogram(name, documentation, labels, buckets))
+
+
+def collector(name: str, documentation: str, kind: str, read: Callable[[], object], labels: Sequence[str] = ()) -> Collector:
+    return registry.register(Collector(name, documentation, kind, labels, read))
+
+
+def render() -> str:
+    return registry.render()
+
+
+# ============ Shared Metrics ============
+
+UPSTREAM_LATENCY = histogram(
+    "upstream_request_duration_seconds",
+    "Upstream call latency by API, operation and report shape (batch calls count once per report).",
+    ("api", "operation", "report"),
+)
+UPSTREAM_ERRORS = counter(
+    "upstream_errors_total",
+    "Failed upstream calls by API, operation and error type.",
+    ("api", "operation", "error"),
+)
+UPSTREAM_IN_FLIGHT = gauge("upstream_requests_in_flight", "Upstream calls currently running.", ("api",))
+ROWS_DECODED = counter("upstream_rows_decoded_total", "Report rows decoded from upstream responses.", ("api",))
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds",
+    "API request latency by route, method and status (streams: until the stream ends).",
+    ("route", "method", "status"),
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "API requests currently being served.")
+
+
+class track_upstream:
+    """
+    Time one upstream call:
+
+        with track_upstream("gsc", "searchAnalytics.query", "query,page"):
+            response = await client.post(...)
+
+    Records latency, in-flight count and (on exceptions) the error type.
+    A batch call passes the shape of each report it carries; its latency is
+    then observed once per report, under that report's label.
+    """
+
+    __slots__ = ("api", "operation", "reports", "started")
+
+    def __init__(self, api: str, operation: str, *reports: str):
+        self.api = api
+        self.operation = operation
+        self.reports = reports or ("",)
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.inc(self.api)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        for report in self.reports:
+            UPSTREAM_LATENCY.observe(elapsed, self.api, self.operation, report)
+        UPSTREAM_IN_FLIGHT.dec(self.api)
+        if exc_type is not None:
+            UPSTREAM_ERRORS.inc(self.api, self.operation, exc_type.__name__)
+        return False
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency per route template
+    (unmatched paths share one label, so scanners cannot blow up the series).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status: Optional[int] = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                time.perf_counter() - started,
+                getattr(route, "path", "unmatched"),
+                scope["method"],
+                str(status or 500),
+            )
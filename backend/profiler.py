@@ -0,0 +1,172 @@
+"""
+Opt-in sampling profiler.
+While switched on (admin endpoint), a sampled fraction of requests is
+profiled: a background thread samples the event-loop thread's stack every
+PROFILE_INTERVAL_MS and the stacks are written to PROFILE_DIR in collapsed
+("folded") format, one file per request, ready for flamegraph.pl or
+speedscope. The event loop is shared, so a profile also shows whatever
+other requests ran meanwhile; time spent blocked in select() is the loop
+idling while it waits on upstream I/O.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Configuration
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Profiles kept on disk (oldest are deleted) and longest time one request is sampled
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Longest the switch stays on before turning itself off (seconds)
+PROFILE_MAX_DURATION = 3600
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+class Profiler:
+    """The admin switch: whether, how often and which paths to profile."""
+
+    def __init__(self, directory: str = PROFILE_DIR, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.sample_rate = 0.0
+        self.path_prefix: Optional[str] = None
+        self.until = 0.0
+        self.profiled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and time.time() < self.until
+
+    def configure(self, enabled: bool, sample_rate: float, path_prefix: Optional[str], duration: float):
+        self.sample_rate = sample_rate if enabled else 0.0
+        self.path_prefix = path_prefix or None
+        self.until = time.time() + min(duration, PROFILE_MAX_DURATION) if enabled else 0.0
+
+    def should_profile(self, path: str) -> bool:
+        if not self.enabled:
+            return False
+        if self.path_prefix and not path.startswith(self.path_prefix):
+            return False
+        return random.random() < self.sample_rate
+
+    def dump(self, method: str, path: str, samples: Counter, elapsed: float) -> Optional[str]:
+        """Write folded stacks for one request; returns the file name."""
+        if not samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        name = f"{stamp}-{method.lower()}-{slug}-{elapsed * 1000:.0f}ms.folded"
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        self.profiled += 1
+        self._prune()
+        return name
+
+    def _prune(self):
+        files = self.files()
+        for name in files[PROFILE_MAX_FILES:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def files(self) -> List[str]:
+        """Profile file names, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((n for n in os.listdir(self.directory) if n.endswith(".folded")), reverse=True)
+
+    def path(self, name: str) -> Optional[str]:
+        """Full path of a stored profile, or None for unknown/unsafe names."""
+        if name != os.path.basename(name) or name not in self.files():
+            return None
+        return os.path.join(self.directory, name)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sampleRate": self.sample_rate if self.enabled else 0.0,
+            "path": self.path_prefix,
+            "remainingSeconds": round(max(0.0, self.until - time.time())) if self.enabled else 0,
+            "intervalMs": self.interval * 1000,
+            "profiled": self.profiled,
+            "files": self.files()[:20],
+        }
+
+
+profiler = Profiler()
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware sampling the stacks of selected requests."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not profiler.should_profile(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(threading.get_ident(), profiler.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            samples = await asyncio.to_thread(sampler.stop)
+            try:
+                await asyncio.to_thread(
+                    profiler.dump, scope["method"], scope["path"], samples, time.perf_counter() - started
+                )
+            except Exception as e:
+                print(f"Failed to write profile for {scope['path']}: {e}")
@@ -0,0 +1,150 @@
+"""
+GA4 quota governor.
+Every Data API call asks GA4 for the property quota (returnPropertyQuota);
+the governor keeps the latest budget per quota category ("core" reports and
+"realtime" reports are metered separately) and turns it into admission
+decisions: cache TTLs stretch as the budget drains, background refreshes
+pause first, and an exhausted quota fails fast instead of calling GA4.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional
+
+# Standard property limits; Analytics 360 properties have 10x these
+GA_QUOTA_TOKENS_PER_DAY = int(os.getenv("GA_QUOTA_TOKENS_PER_DAY", "200000"))
+GA_QUOTA_TOKENS_PER_HOUR = int(os.getenv("GA_QUOTA_TOKENS_PER_HOUR", "40000"))
+GA_QUOTA_TOKENS_PER_PROJECT_PER_HOUR = int(os.getenv("GA_QUOTA_TOKENS_PER_PROJECT_PER_HOUR", "14000"))
+# Background refreshes pause once less than this fraction of the budget is left
+QUOTA_BACKGROUND_RESERVE = float(os.getenv("QUOTA_BACKGROUND_RESERVE", "0.5"))
+# Below this fraction cache TTLs are stretched, up to QUOTA_MAX_TTL_FACTOR
+QUOTA_STRETCH_BELOW = float(os.getenv("QUOTA_STRETCH_BELOW", "0.5"))
+QUOTA_MAX_TTL_FACTOR = float(os.getenv("QUOTA_MAX_TTL_FACTOR", "8"))
+
+# PropertyQuota field -> (limit, seconds after which an observation no longer applies)
+BUDGETS = {
+    "tokens_per_hour": (GA_QUOTA_TOKENS_PER_HOUR, 3600),
+    "tokens_per_project_per_hour": (GA_QUOTA_TOKENS_PER_PROJECT_PER_HOUR, 3600),
+    "tokens_per_day": (GA_QUOTA_TOKENS_PER_DAY, 24 * 3600),
+}
+
+
+class QuotaBudget:
+    """Latest quota observations for one category."""
+
+    def __init__(self):
+        # field -> (remaining, observed_at)
+        self.remaining: Dict[str, tuple] = {}
+        self.concurrent_remaining: Optional[int] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.tokens = 0
+        self.exhausted_until = 0.0
+        self.exhausted_reason: Optional[str] = None
+
+    def level(self) -> float:
+        """Fraction (0..1) of the tightest token budget still available."""
+        now = time.monotonic()
+        level = 1.0
+        for field, (limit, window) in BUDGETS.items():
+            observed = self.remaining.get(field)
+            if observed is None or now - observed[1] > window or limit <= 0:
+                continue
+            level = min(level, max(0.0, observed[0] / limit))
+        return level
+
+
+class QuotaGovernor:
+    def __init__(self):
+        self.budgets: Dict[str, QuotaBudget] = {}
+        self.shed = 0
+        self.rejected = 0
+
+    def budget(self, category: str) -> QuotaBudget:
+        if category not in self.budgets:
+            self.budgets[category] = QuotaBudget()
+        return self.budgets[category]
+
+    def observe(self, category: str, property_quota: Any):
+        """Record the PropertyQuota returned with a response."""
+        if property_quota is None:
+            return
+        budget = self.budget(category)
+        now = time.monotonic()
+        for field in BUDGETS:
+            status = getattr(property_quota, field, None)
+            if status is None or not (status.consumed or status.remaining):
+                continue
+            budget.remaining[field] = (status.remaining, now)
+            if field == "tokens_per_hour":
+                budget.tokens += status.consumed
+        concurrent = getattr(property_quota, "concurrent_requests", None)
+        if concurrent is not None and (concurrent.consumed or concurrent.remaining):
+            budget.concurrent_remaining = concurrent.remaining
+
+    def exhausted(self, category: str, message: str) -> float:
+        """
+        Record a RESOURCE_EXHAUSTED error and return how long (seconds) calls
+        in this category are refused. The message names the quota.
+        """
+        text = message.lower()
+        if "concurrent" in text:
+            backoff = 5
+        elif "per day" in text:
+            backoff = 3600
+        else:
+            # Hourly budgets: re-probe at the top of the hour
+            backoff = max(60, 3600 - time.time() % 3600)
+        budget = self.budget(category)
+        budget.exhausted_until = time.monotonic() + backoff
+        budget.exhausted_reason = message
+        return backoff
+
+    def blocked_for(self, category: str) -> float:
+        """Seconds until calls in `category` are admitted again (0 when allowed)."""
+        remaining = self.budget(category).exhausted_until - time.monotonic()
+        return remaining if remaining > 0 else 0.0
+
+    def level(self, category: str) -> float:
+        if self.blocked_for(category):
+            return 0.0
+        return self.budget(category).level()
+
+    def ttl_factor(self, category: str) -> float:
+        """Multiplier for cache TTLs: 1 while the budget is healthy, growing as it drains."""
+        level = self.level(category)
+        if level >= QUOTA_STRETCH_BELOW:
+            return 1.0
+        if level <= 0:
+            return QUOTA_MAX_TTL_FACTOR
+        return min(QUOTA_MAX_TTL_FACTOR, QUOTA_STRETCH_BELOW / level)
+
+    def allow_background(self, category: str) -> bool:
+        """Low-priority work (scheduled refreshes) keeps a reserve for interactive use."""
+        allowed = self.level(category) >= QUOTA_BACKGROUND_RESERVE
+        if not allowed:
+            self.shed += 1
+        return allowed
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backgroundShed": self.shed,
+            "rejected": self.rejected,
+            "categories": {
+                category: {
+                    "level": round(self.level(category), 4),
+                    "ttlFactor": round(self.ttl_factor(category), 2),
+                    "remaining": {field: remaining for field, (remaining, _) in budget.remaining.items()},
+                    "concurrentRemaining": budget.concurrent_remaining,
+                    "inFlight": budget.in_flight,
+                    "calls": budget.calls,
+                    "tokensConsumed": budget.tokens,
+                    "blockedFor": round(self.blocked_for(category)),
+                    "exhaustedReason": budget.exhausted_reason if self.blocked_for(category) else None,
+                }
+                for category, budget in sorted(self.budgets.items())
+            },
+        }
+
+
+quota_governor = QuotaGovernor()
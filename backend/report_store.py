@@ -0,0 +1,94 @@
+"""
+Persistent per-day report store (SQLite).
+Keeps finalized daily GA4 rows so long date windows only fetch missing days.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH", "report_store.sqlite3")
+
+
+def dataset_key(dimensions: Iterable[str], metrics: Iterable[str], variant: str = "") -> str:
+    """Stable identifier for a dimension/metric set (order-insensitive)."""
+    key = f"d={','.join(sorted(dimensions))};m={','.join(sorted(metrics))}"
+    return f"{key};{variant}" if variant else key
+
+
+class ReportStore:
+    """
+    Daily rows keyed by (property, dataset, date).
+    A stored day with an empty row list means "fetched, no data", which is
+    different from a missing day.
+    """
+
+    def __init__(self, path: str = REPORT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS daily_rows (
+                    property TEXT NOT NULL,
+                    dataset TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    rows TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (property, dataset, date)
+                )
+                """
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_days(self, property_id: str, dataset: str, start: str, end: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Stored rows per day (YYYY-MM-DD) within [start, end]."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT date, rows FROM daily_rows "
+                "WHERE property = ? AND dataset = ? AND date BETWEEN ? AND ?",
+                (property_id, dataset, start, end),
+            )
+            return {date: json.loads(rows) for date, rows in cursor}
+
+    def put_days(self, property_id: str, dataset: str, days: Dict[str, List[Dict[str, Any]]]):
+        """Insert or replace the rows for each given day."""
+        if not days:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_rows (property, dataset, date, rows, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (property_id, dataset, date, json.dumps(rows, separators=(",", ":")), now)
+                    for date, rows in days.items()
+                ],
+            )
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT dataset, COUNT(*), MIN(date), MAX(date) FROM daily_rows GROUP BY dataset"
+            )
+            return {
+                dataset: {"days": count, "first": first, "last": last}
+                for dataset, count, first, last in cursor
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
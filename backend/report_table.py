@@ -0,0 +1,104 @@
+"""
+Columnar GA4 report results.
+Rows are transposed once into one column per dimension/metric; metric
+columns are decoded in bulk by the type GA4 declares in `metric_headers`.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Sequence
+
+from metrics import ROWS_DECODED
+from timing import phase
+
+# google.analytics.data_v1beta.types.MetricType values
+METRIC_TYPE_UNSPECIFIED = 0
+TYPE_INTEGER = 1
+
+
+def decode_metric(values: Sequence[str], metric_type: int) -> Sequence:
+    """
+    Decode a column of GA4 metric strings: integers into array('q'), every
+    other declared type (float, seconds, currency, ...) into array('d').
+    Undeclared or malformed columns fall back to per-value parsing.
+    """
+    try:
+        if metric_type == TYPE_INTEGER:
+            return array("q", map(int, values))
+        if metric_type != METRIC_TYPE_UNSPECIFIED:
+            return array("d", map(float, values))
+    except ValueError:
+        pass
+    return [_parse_number(value) for value in values]
+
+
+def _parse_number(value: str) -> Any:
+    try:
+        return float(value) if "." in value else int(value)
+    except ValueError:
+        return value
+
+
+class ReportTable:
+    """
+    A GA4 report as columns: `table["pagePath"]` is the list of page paths,
+    `table["screenPageViews"]` the matching typed array. Endpoints zip the
+    columns they need instead of walking per-row dicts.
+    """
+
+    __slots__ = ("dimensions", "metrics", "columns")
+
+    def __init__(self, dimensions: List[str], metrics: List[str], columns: Dict[str, Sequence]):
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.columns = columns
+
+    @classmethod
+    def from_response(cls, response, dimensions: List[str], metrics: List[str]) -> "ReportTable":
+        """Build from a RunReportResponse/RunRealtimeReportResponse."""
+        with phase("decode"):
+            return cls._decode(response, dimensions, metrics)
+
+    @classmethod
+    def _decode(cls, response, dimensions: List[str], metrics: List[str]) -> "ReportTable":
+        # The raw protobuf avoids the proto-plus wrapper on every cell access
+        pb = type(response).pb(response)
+        dim_rows = [[v.value for v in row.dimension_values] for row in pb.rows]
+        met_rows = [[v.value for v in row.metric_values] for row in pb.rows]
+        types = [int(header.type_) for header in response.metric_headers]
+        ROWS_DECODED.inc("ga4", amount=len(dim_rows))
+
+        columns: Dict[str, Sequence] = {}
+        dim_columns = list(zip(*dim_rows)) if dim_rows else [()] * len(dimensions)
+        for name, values in zip(dimensions, dim_columns):
+            columns[name] = list(values)
+        met_columns = list(zip(*met_rows)) if met_rows else [()] * len(metrics)
+        for i, (name, values) in enumerate(zip(metrics, met_columns)):
+            columns[name] = decode_metric(values, types[i] if i < len(types) else METRIC_TYPE_UNSPECIFIED)
+        return cls(dimensions, metrics, columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], dimensions: List[str], metrics: List[str]) -> "ReportTable":
+        """Build from row dicts (e.g. rows read back from report_store)."""
+        records = list(records)
+        columns: Dict[str, Sequence] = {name: [r[name] for r in records] for name in dimensions}
+        for name in metrics:
+            values = [r[name] for r in records]
+            if all(type(v) is int for v in values):
+                columns[name] = array("q", values)
+            elif all(isinstance(v, (int, float)) for v in values):
+                columns[name] = array("d", values)
+            else:
+                columns[name] = values
+        return cls(dimensions, metrics, columns)
+
+    def __len__(self) -> int:
+        names = self.dimensions or self.metrics
+        return len(self.columns[names[0]]) if names else 0
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Row dicts, for storage or generic consumers."""
+        names = self.dimensions + self.metrics
+        return [dict(zip(names, values)) for values in zip(*(self.columns[n] for n in names))]
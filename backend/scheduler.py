@@ -0,0 +1,120 @@
+"""
+Background refresh scheduler.
+Periodically re-runs report jobs so caches and stores are warm before users ask.
+"""
+
+import time
+import random
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class RefreshJob:
+    """A named dataset refreshed every `interval` seconds."""
+
+    def __init__(self, name: str, fn: Callable[[], Awaitable[Any]], interval: float):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.last_refresh: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_duration: Optional[float] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "dataset": self.name,
+            "lastRefresh": self.last_refresh.isoformat() if self.last_refresh else None,
+            "lastDurationMs": round(self.last_duration * 1000) if self.last_duration is not None else None,
+            "lastError": self.last_error,
+            "runs": self.runs,
+            "failures": self.failures,
+            "nextRunIn": max(0, round(self.next_run - time.monotonic())),
+        }
+
+
+class RefreshScheduler:
+    """
+    Runs due jobs one at a time, `pace` seconds apart, so background refreshes
+    never burst against upstream quotas. Each run is rescheduled with +/-
+    `jitter` (fraction of the interval); failures back off exponentially,
+    capped at the job interval.
+    """
+
+    def __init__(self, pace: float = 1.0, jitter: float = 0.1, startup_spread: float = 30.0):
+        self.pace = pace
+        self.jitter = jitter
+        self.startup_spread = startup_spread
+        self.jobs: List[RefreshJob] = []
+        self._task: Optional[asyncio.Task] = None
+        # Optional hook consulted before each run; returning False skips it
+        self.should_run: Callable[[RefreshJob], bool] = lambda job: True
+
+    def add(self, name: str, fn: Callable[[], Awaitable[Any]], interval: float) -> RefreshJob:
+        job = RefreshJob(name, fn, interval)
+        self.jobs.append(job)
+        return job
+
+    def start(self):
+        if self._task is not None or not self.jobs:
+            return
+        # Pre-warm: every job is due shortly after startup, spread out
+        now = time.monotonic()
+        for job in self.jobs:
+            job.next_run = now + random.uniform(0, self.startup_spread)
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _reschedule(self, job: RefreshJob, delay: float):
+        spread = delay * self.jitter
+        job.next_run = time.monotonic() + delay + random.uniform(-spread, spread)
+
+    async def _loop(self):
+        while True:
+            job = min(self.jobs, key=lambda j: j.next_run)
+            wait = job.next_run - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            if not self.should_run(job):
+                self._reschedule(job, job.interval)
+                continue
+
+            await self._run(job)
+            await asyncio.sleep(self.pace)
+
+    async def _run(self, job: RefreshJob):
+        started = time.monotonic()
+        job.runs += 1
+        try:
+            await job.fn()
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(getattr(e, "detail", e))
+            self._reschedule(job, min(job.interval, 30 * 2 ** min(job.failures, 10)))
+        else:
+            job.failures = 0
+            job.last_error = None
+            job.last_refresh = datetime.now()
+            self._reschedule(job, job.interval)
+        finally:
+            job.last_duration = time.monotonic() - started
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "jobs": [job.status() for job in sorted(self.jobs, key=lambda j: j.name)],
+        }
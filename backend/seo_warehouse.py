@@ -0,0 +1,279 @@
+"""
+Local Search Console warehouse (SQLite).
+Keeps query x page rows per day so trend and comparison reports are answered
+locally instead of re-querying the Search Console API.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+SEO_WAREHOUSE_PATH = os.getenv("SEO_WAREHOUSE_PATH", "seo_warehouse.sqlite3")
+
+# Columns that can be grouped or filtered on (interpolated into SQL, so whitelisted)
+DIMENSIONS = ("query", "page")
+
+
+def _metrics(clicks: int, impressions: int, weighted_position: float) -> Dict[str, Any]:
+    """Totals in the shape of the /api/seo/* endpoints (impression-weighted position)."""
+    return {
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": round(clicks / impressions * 100, 2) if impressions else 0,
+        "position": round(weighted_position / impressions, 1) if impressions else 0,
+    }
+
+
+class SeoWarehouse:
+    """
+    Rows keyed by (site, date, query, page), one partition per day.
+    gsc_days records which days were synced, so a day without traffic is
+    different from a day that was never fetched, and whether the day was
+    final when fetched (GSC still revises recent days, so those are
+    provisional until synced again). A day is always replaced as a whole,
+    in one transaction.
+    """
+
+    def __init__(self, path: str = SEO_WAREHOUSE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS gsc_rows (
+                    site TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    page TEXT NOT NULL,
+                    clicks INTEGER NOT NULL,
+                    impressions INTEGER NOT NULL,
+                    position REAL NOT NULL,
+                    PRIMARY KEY (site, date, query, page)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS gsc_rows_query ON gsc_rows (site, query, date);
+                CREATE INDEX IF NOT EXISTS gsc_rows_page ON gsc_rows (site, page, date);
+                CREATE TABLE IF NOT EXISTS gsc_days (
+                    site TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    synced_at REAL NOT NULL,
+                    final INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (site, date)
+                );
+                """
+            )
+            self._migrate_final()
+            self._conn.commit()
+        return self._conn
+
+    def _migrate_final(self):
+        """Add gsc_days.final (schema v0); days synced before count as provisional."""
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        columns = {name for _, name, *_ in self._conn.execute("PRAGMA table_info(gsc_days)")}
+        with self._conn:
+            if "final" not in columns:
+                self._conn.execute("ALTER TABLE gsc_days ADD COLUMN final INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("PRAGMA user_version = 1")
+
+    def synced_days(self, site: str, start: str, end: str) -> Dict[str, bool]:
+        """Days (YYYY-MM-DD) within [start, end] that have been synced, mapped to whether they are final."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT date, final FROM gsc_days WHERE site = ? AND date BETWEEN ? AND ?",
+                (site, start, end),
+            )
+            return {date: bool(final) for date, final in cursor}
+
+    def replace_days(
+        self,
+        site: str,
+        days: Dict[str, Iterable[Dict[str, Any]]],
+        mutable_from: Optional[str] = None
+    ):
+        """
+        Replace the partitions for each given day with Search Analytics rows
+        fetched with dimensions ["date", "query", "page"]. Days on or after
+        `mutable_from` are stored as provisional.
+        """
+        if not days:
+            return
+        now = time.time()
+        with self._lock:
+            with self._connect() as conn:
+                for date, rows in days.items():
+                    conn.execute("DELETE FROM gsc_rows WHERE site = ? AND date = ?", (site, date))
+                    cursor = conn.executemany(
+                        "INSERT OR REPLACE INTO gsc_rows "
+                        "(site, date, query, page, clicks, impressions, position) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (site, date, row["keys"][1], row["keys"][2],
+                             row["clicks"], row["impressions"], row["position"])
+                            for row in rows
+                        ],
+                    )
+                    final = mutable_from is None or date < mutable_from
+                    conn.execute(
+                        "INSERT OR REPLACE INTO gsc_days (site, date, row_count, synced_at, final) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (site, date, cursor.rowcount, now, final),
+                    )
+
+    def history(self, site: str, dimension: str, value: str, start: str, end: str) -> Dict[str, Any]:
+        """Daily totals for one query (or page), plus its breakdown by the other dimension."""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        other = "page" if dimension == "query" else "query"
+        with self._lock:
+            conn = self._connect()
+            daily = conn.execute(
+                f"SELECT date, SUM(clicks), SUM(impressions), SUM(position * impressions) "
+                f"FROM gsc_rows WHERE site = ? AND {dimension} = ? AND date BETWEEN ? AND ? "
+                f"GROUP BY date ORDER BY date",
+                (site, value, start, end),
+            ).fetchall()
+            breakdown = conn.execute(
+                f"SELECT {other}, SUM(clicks) AS c, SUM(impressions), SUM(position * impressions) "
+                f"FROM gsc_rows WHERE site = ? AND {dimension} = ? AND date BETWEEN ? AND ? "
+                f"GROUP BY {other} ORDER BY c DESC",
+                (site, value, start, end),
+            ).fetchall()
+
+        clicks = sum(row[1] for row in daily)
+        impressions = sum(row[2] for row in daily)
+        return {
+            dimension: value,
+            **_metrics(clicks, impressions, sum(row[3] for row in daily)),
+            "history": [{"date": date, **_metrics(c, i, w)} for date, c, i, w in daily],
+            ("pages" if other == "page" else "queries"): [
+                {other: key, **_metrics(c, i, w)} for key, c, i, w in breakdown
+            ],
+        }
+
+    def movers(
+        self,
+        site: str,
+        dimension: str,
+        current: tuple,
+        previous: tuple,
+        by: str = "clicks",
+        min_impressions: int = 10,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Queries (or pages) with the largest change between two periods.
+        `by="position"` ranks by position change and only considers rows
+        with impressions in both periods.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        order = {
+            "clicks": "ABS(c_now - c_prev) DESC",
+            "impressions": "ABS(i_now - i_prev) DESC",
+            "position": "ABS(w_now / i_now - w_prev / i_prev) DESC",
+        }[by]
+        both_periods = "AND i_now > 0 AND i_prev > 0" if by == "position" else ""
+        with self._lock:
+            rows = self._connect().execute(
+                f"""
+                SELECT key, c_now, i_now, w_now, c_prev, i_prev, w_prev FROM (
+                    SELECT {dimension} AS key,
+                        SUM(CASE WHEN date >= :cur_start THEN clicks ELSE 0 END) AS c_now,
+                        SUM(CASE WHEN date >= :cur_start THEN impressions ELSE 0 END) AS i_now,
+                        SUM(CASE WHEN date >= :cur_start THEN position * impressions ELSE 0 END) AS w_now,
+                        SUM(CASE WHEN date < :cur_start THEN clicks ELSE 0 END) AS c_prev,
+                        SUM(CASE WHEN date < :cur_start THEN impressions ELSE 0 END) AS i_prev,
+                        SUM(CASE WHEN date < :cur_start THEN position * impressions ELSE 0 END) AS w_prev
+                    FROM gsc_rows
+                    WHERE site = :site AND date BETWEEN :prev_start AND :cur_end
+                    GROUP BY {dimension}
+                )
+                WHERE i_now + i_prev >= :min_impressions {both_periods}
+                ORDER BY {order}
+                LIMIT :limit
+                """,
+                {
+                    "site": site,
+                    "cur_start": current[0],
+                    "cur_end": current[1],
+                    "prev_start": previous[0],
+                    "min_impressions": min_impressions,
+                    "limit": limit,
+                },
+            ).fetchall()
+
+        results = []
+        for key, c_now, i_now, w_now, c_prev, i_prev, w_prev in rows:
+            now = _metrics(c_now, i_now, w_now)
+            prev = _metrics(c_prev, i_prev, w_prev)
+            results.append({
+                dimension: key,
+                "current": now,
+                "previous": prev,
+                "clicksChange": c_now - c_prev,
+                "impressionsChange": i_now - i_prev,
+                # Positive means the average position improved (moved up)
+                "positionChange": round(prev["position"] - now["position"], 1) if i_now and i_prev else None,
+            })
+        return results
+
+    def cannibalization(
+        self,
+        site: str,
+        start: str,
+        end: str,
+        min_impressions: int = 10,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Queries for which two or more pages each collected `min_impressions`."""
+        with self._lock:
+            rows = self._connect().execute(
+                """
+                SELECT query, page, SUM(clicks), SUM(impressions) AS i, SUM(position * impressions)
+                FROM gsc_rows
+                WHERE site = ? AND date BETWEEN ? AND ?
+                GROUP BY query, page
+                HAVING i >= ?
+                ORDER BY query, i DESC
+                """,
+                (site, start, end, min_impressions),
+            ).fetchall()
+
+        by_query: Dict[str, List[Dict[str, Any]]] = {}
+        for query, page, c, i, w in rows:
+            by_query.setdefault(query, []).append({"page": page, **_metrics(c, i, w)})
+
+        results = [
+            {
+                "query": query,
+                "impressions": sum(p["impressions"] for p in pages),
+                "clicks": sum(p["clicks"] for p in pages),
+                "pages": pages,
+            }
+            for query, pages in by_query.items()
+            if len(pages) > 1
+        ]
+        results.sort(key=lambda r: r["impressions"], reverse=True)
+        return results[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            days, provisional, rows, first, last = self._connect().execute(
+                "SELECT COUNT(*), COUNT(*) - COALESCE(SUM(final), 0), COALESCE(SUM(row_count), 0), "
+                "MIN(date), MAX(date) FROM gsc_days"
+            ).fetchone()
+            return {"days": days, "provisionalDays": provisional, "rows": rows, "first": first, "last": last}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
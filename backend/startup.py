@@ -0,0 +1,92 @@
+"""
+Startup warm-up and readiness.
+Work the first requests would otherwise pay for (importing the GA4 client
+library, building clients, opening the gRPC channel, fetching OAuth tokens)
+runs as concurrent steps in the background once the server is up; /ready
+answers 503 until they have finished, so the platform only routes traffic
+to a warm process. A step that fails or times out is reported but does not
+hold readiness back: the endpoints surface the same error on use.
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Configuration
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+# Longest any single warm-up step may take (seconds)
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "20"))
+
+
+class Warmup:
+    def __init__(self, enabled: bool = STARTUP_WARMUP, timeout: float = STARTUP_WARMUP_TIMEOUT):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.import_seconds: Optional[float] = None
+        self.steps: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, step: Callable[[], Awaitable[Any]]):
+        self.steps[name] = step
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        if not self.enabled or not self.steps:
+            self.finished_at = self.started_at
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            await asyncio.gather(*(self._run_step(name, step) for name, step in self.steps.items()))
+        finally:
+            self.finished_at = time.monotonic()
+            self._task = None
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]]):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(step(), self.timeout)
+            result: Dict[str, Any] = {"ok": True}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(getattr(e, "detail", e))}
+            print(f"Warm-up step {name} failed: {result['error']}")
+        result["seconds"] = round(time.monotonic() - started, 3)
+        self.results[name] = result
+
+    async def stop(self):
+        task = self._task
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def status(self) -> Dict[str, Any]:
+        warmup_seconds = None
+        if self.started_at is not None and self.finished_at is not None:
+            warmup_seconds = round(self.finished_at - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "importSeconds": self.import_seconds,
+            "warmupSeconds": warmup_seconds,
+            "steps": {
+                name: self.results.get(name, {"ok": None})
+                for name in self.steps
+            } if self.enabled else {},
+        }
+
+
+warmup = Warmup()
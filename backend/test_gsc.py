@@ -3,21 +3,20 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import asyncio
 import gsc
 
-def test_gsc():
+async def test_gsc():
     print("Testing GSC Integration...")
     print(f"Property URL: {os.getenv('GSC_PROPERTY_URL')}")
     
     try:
-        service = gsc.get_gsc_service()
-        if service:
+        if gsc.get_credentials_info():
             print("✅ Service initialized successfully.")
             
             # List accessible sites
             print("Checking accessible sites...")
-            sites_response = service.sites().list().execute()
-            sites = sites_response.get('siteEntry', [])
+            sites = await gsc.list_sites()
             print(f"User has access to {len(sites)} sites:")
             for s in sites:
                 print(f" - {s['siteUrl']} (Permission: {s['permissionLevel']})")
@@ -30,19 +29,21 @@ def test_gsc():
         start, end = gsc.get_date_range(3)
         print(f"Date range: {start} to {end}")
         
-        data = gsc.fetch_search_analytics(start, end, row_limit=5)
+        data = await gsc.fetch_search_analytics(start, end, row_limit=5)
         print(f"✅ Fetch success. Rows returned: {len(data)}")
         if data:
             print(f"Sample row: {data[0]}")
             
         print("Fetching sitemaps...")
-        sitemaps = gsc.get_sitemaps_status()
+        sitemaps = await gsc.get_sitemaps_status()
         print(f"✅ Sitemaps fetch success. Count: {len(sitemaps)}")
         for s in sitemaps:
             print(f" - {s.get('path')}: {s.get('lastSubmitted')}")
             
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        await gsc.close()
 
 if __name__ == "__main__":
-    test_gsc()
+    asyncio.run(test_gsc())
@@ -0,0 +1,88 @@
+"""
+Per-request phase timings, reported in a Server-Timing header.
+Code marks its phases with `with timing.phase("decode"):`; the durations are
+summed into the current request's timings (a context variable, so tasks the
+request spawns report into it too) and the middleware emits them when the
+response starts. Outside a request, phase() records nothing.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Header order and descriptions; phases overlap when a request fans out
+PHASES: List[Tuple[str, str]] = [
+    ("upstream", "Upstream wait (GA4, GSC, geocoding)"),
+    ("decode", "Report decoding"),
+    ("reshape", "Endpoint outside upstream waits"),
+    ("encode", "JSON encoding"),
+    ("total", "Total"),
+]
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+
+
+class phase:
+    """Add the duration of the block to the current request's `name` phase."""
+
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+def header_value(timings: Dict[str, float]) -> str:
+    """Render timings (seconds) as a Server-Timing value in milliseconds."""
+    # "handler" is the endpoint's wall time; what it did not spend waiting is reshaping
+    if "handler" in timings:
+        timings["reshape"] = max(0.0, timings["handler"] - timings.get("upstream", 0.0))
+    return ", ".join(
+        f'{name};dur={timings[name] * 1000:.1f};desc="{desc}"'
+        for name, desc in PHASES
+        if name in timings
+    )
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware adding Server-Timing to every HTTP response."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", header_value(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
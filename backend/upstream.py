@@ -0,0 +1,209 @@
+"""
+Execution layer for blocking upstream calls (GA4 Data API, Search Console).
+Runs synchronous client calls in a bounded thread pool so the event loop stays free.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import timing
+
+# Configuration
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Lazy initialization of the upstream worker pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=UPSTREAM_MAX_CONCURRENCY,
+                    thread_name_prefix="upstream",
+                )
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(UPSTREAM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def run_blocking(
+    fn: Callable[..., Any],
+    *args,
+    timeout: Optional[float] = None,
+    **kwargs
+) -> Any:
+    """
+    Run a blocking call in the upstream pool.
+    At most UPSTREAM_MAX_CONCURRENCY calls run at once; the rest wait without
+    holding the event loop. Raises asyncio.TimeoutError after `timeout` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+
+    async with _get_semaphore():
+        return await asyncio.wait_for(
+            loop.run_in_executor(get_executor(), call),
+            timeout=timeout or UPSTREAM_TIMEOUT,
+        )
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical upstream calls.
+    Callers sharing a key while a call is in flight all await the same task
+    and receive its result (or exception). The call itself is owned by the
+    group, so a disconnecting caller does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.shared += 1
+        # Joiners wait as long as the caller that started the call
+        with timing.phase("upstream"):
+            return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"inFlight": len(self._calls), "started": self.started, "coalesced": self.shared}
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: `rate` tokens per second, bursts up to
+    `capacity`. acquire() waits until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within a short window and runs them as batches.
+
+    Items are grouped by `group_key`; a group is flushed when it reaches
+    `max_batch` items or `window` seconds after its first item arrived.
+    `run_batch` receives the list of items and must return one result per
+    item, in order. A batch failure is raised to every caller in it.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 5,
+        window: float = 0.01,
+        group_key: Callable[[Any], Hashable] = lambda item: None
+    ):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.window = window
+        self.group_key = group_key
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        if self.window <= 0 or self.max_batch <= 1:
+            return (await self.run_batch([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = self.group_key(item)
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+
+        if len(pending) >= self.max_batch:
+            self._flush(key)
+        elif len(pending) == 1:
+            loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "items": self.items}
+
+
+def shutdown():
+    """Stop the worker pool (used on application shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -29,7 +29,7 @@ import {
   Geography,
   Marker,
 } from 'react-simple-maps';
-import { getRealtime, geocodeCities, type RealtimeResponse, type RealtimeCityItem, type GeocodedCity } from '@/lib/analytics/ga4-api';
+import { getRealtime, geocodeCities, subscribeRealtime, type RealtimeResponse, type RealtimeCityItem, type GeocodedCity } from '@/lib/analytics/ga4-api';
 
 // Country code mapping for flags
 const countryToCode: Record<string, string> = {
@@ -492,41 +492,65 @@ export default function TempoRealPage() {
   const [lastUpdate, setLastUpdate] = useState<string>('');
   const [autoRefresh, setAutoRefresh] = useState(true);
 
+  const geocode = useCallback(async (cities: RealtimeCityItem[]) => {
+    // Geocode cities for map display
+    if (cities.length === 0) {
+      setGeocodedCities([]);
+      return;
+    }
+    try {
+      const geocoded = await geocodeCities(cities);
+      setGeocodedCities(geocoded.cities);
+      // Uncached cities are still being geocoded; pick them up shortly
+      if (geocoded.pending) {
+        setTimeout(() => {
+          geocodeCities(cities)
+            .then((retry) => setGeocodedCities(retry.cities))
+            .catch(() => {});
+        }, 5000);
+      }
+    } catch (geoErr) {
+      console.error('Geocoding error:', geoErr);
+      // Continue without geocoded cities
+    }
+  }, []);
+
+  const applyResult = useCallback((result: RealtimeResponse, changed: string[]) => {
+    setData(result);
+    setLastUpdate(new Date().toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' }));
+    setError(null);
+    setLoading(false);
+    if (changed.includes('cities')) {
+      geocode(result.cities || []);
+    }
+  }, [geocode]);
+
   const fetchData = useCallback(async () => {
     try {
       setLoading(true);
       const result = await getRealtime();
-      setData(result);
-      setLastUpdate(new Date().toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' }));
-      setError(null);
-      
-      // Geocode cities for map display
-      if (result.cities && result.cities.length > 0) {
-        try {
-          const geocoded = await geocodeCities(result.cities);
-          setGeocodedCities(geocoded.cities);
-        } catch (geoErr) {
-          console.error('Geocoding error:', geoErr);
-          // Continue without geocoded cities
-        }
-      }
+      applyResult(result, Object.keys(result));
     } catch (err) {
       console.error('Error fetching realtime data:', err);
       setError('Erro ao carregar dados em tempo real');
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [applyResult]);
 
   useEffect(() => {
     fetchData();
   }, [fetchData]);
 
   useEffect(() => {
+    // Auto refresh: the backend pushes updates (one shared poller for all viewers)
     if (!autoRefresh) return;
-    const interval = setInterval(fetchData, 60000);
-    return () => clearInterval(interval);
-  }, [autoRefresh, fetchData]);
+    return subscribeRealtime(applyResult, (message, closed) => {
+      console.error('Realtime stream error:', message);
+      // The stream gave up (e.g. backend error): fall back to a regular request
+      if (closed) fetchData();
+    });
+  }, [autoRefresh, applyResult, fetchData]);
 
   const activePages = Object.keys(data?.urls || {}).length;
   const activeCountries = Object.keys(data?.countries || {}).length;
@@ -132,6 +132,8 @@ export interface RealtimeResponse {
   events: Record<string, number>;
   minutesTrend: RealtimeMinuteItem[];
   timestamp: string;
+  /** Sections whose query failed (their data is empty) */
+  errors?: Record<string, string>;
 }
 
 export interface EventsResponse {
@@ -154,6 +156,8 @@ export interface GeocodedCity {
 
 export interface GeocodeCitiesResponse {
   cities: GeocodedCity[];
+  /** Cities still being geocoded; request again to get them */
+  pending?: number;
 }
 
 // ============ API Functions ============
@@ -243,6 +247,68 @@ export async function getRealtime(): Promise<RealtimeResponse> {
   return fetchGA4<RealtimeResponse>("/api/realtime");
 }
 
+/**
+ * Apply an RFC 7396 JSON merge patch (null removes a key, arrays are replaced)
+ */
+function applyMergePatch(target: unknown, patch: unknown): unknown {
+  if (patch === null || typeof patch !== "object" || Array.isArray(patch)) {
+    return patch;
+  }
+  const result: Record<string, unknown> =
+    target && typeof target === "object" && !Array.isArray(target)
+      ? { ...(target as Record<string, unknown>) }
+      : {};
+  for (const [key, value] of Object.entries(patch)) {
+    if (value === null) {
+      delete result[key];
+    } else {
+      result[key] = applyMergePatch(result[key], value);
+    }
+  }
+  return result;
+}
+
+/**
+ * Subscribe to realtime data pushed by the backend (Server-Sent Events).
+ * `onUpdate` gets the full data and the top-level keys that changed, after
+ * the initial snapshot and after every patch. `onError` reports failed
+ * backend polls, and a closed stream with `closed` set.
+ * Returns an unsubscribe function.
+ */
+export function subscribeRealtime(
+  onUpdate: (data: RealtimeResponse, changed: string[]) => void,
+  onError?: (message: string, closed: boolean) => void
+): () => void {
+  const source = new EventSource(`${GA_BACKEND_URL}/api/realtime/stream`);
+  let current: RealtimeResponse | null = null;
+
+  source.addEventListener("snapshot", (event) => {
+    current = JSON.parse((event as MessageEvent).data) as RealtimeResponse;
+    onUpdate(current, Object.keys(current));
+  });
+
+  source.addEventListener("patch", (event) => {
+    if (!current) return;
+    const patch = JSON.parse((event as MessageEvent).data);
+    current = applyMergePatch(current, patch) as RealtimeResponse;
+    onUpdate(current, Object.keys(patch));
+  });
+
+  source.addEventListener("poll-error", (event) => {
+    const { detail } = JSON.parse((event as MessageEvent).data);
+    onError?.(detail, false);
+  });
+
+  // Connection errors: EventSource reconnects by itself and gets a new snapshot
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) {
+      onError?.("Realtime stream closed", true);
+    }
+  };
+
+  return () => source.close();
+}
+
 export async function getEvents(period: string): Promise<EventsResponse> {
   return fetchGA4<EventsResponse>("/api/events", {
     days: periodToDays(period),
@@ -265,36 +331,55 @@ export async function getLeads(
   return fetchGA4("/api/leads", { days: periodToDays(period) });
 }
 
+export interface DashboardResponse {
+  sections: {
+    stats?: StatsResponse;
+    "pageviews-series"?: PageviewsSeriesResponse;
+    "top-pages"?: TopPagesResponse;
+    devices?: DevicesResponse;
+    channels?: ChannelsResponse;
+    realtime?: RealtimeResponse;
+  };
+  errors: Record<string, string>;
+  period: string;
+}
+
+export async function getDashboard(
+  period: string,
+  sections: string[]
+): Promise<DashboardResponse> {
+  return fetchGA4<DashboardResponse>("/api/dashboard", {
+    days: periodToDays(period),
+    sections: sections.join(","),
+  });
+}
+
 /**
- * Fetch all main analytics data in parallel
+ * Fetch all main analytics data in a single backend request
  */
 export async function getAllAnalyticsData(period: string) {
-  const [stats, pageviewsSeries, topPages, devices, channels, realtime] =
-    await Promise.all([
-      getStats(period),
-      getPageviewsSeries(period),
-      getTopPages(period),
-      getDevices(period),
-      getChannels(period),
-      getRealtime().catch(() => ({
-        activeVisitors: 0,
-        urls: {},
-        countries: {},
-        cities: [],
-        devices: {},
-        events: {},
-        minutesTrend: [],
-        timestamp: "",
-      })),
-    ]);
+  const { sections, errors } = await getDashboard(period, [
+    "stats",
+    "pageviews-series",
+    "top-pages",
+    "devices",
+    "channels",
+    "realtime",
+  ]);
+
+  // Realtime is optional; any other missing section is an error
+  const failed = Object.keys(errors).filter((name) => name !== "realtime");
+  if (failed.length > 0) {
+    throw new Error(errors[failed[0]]);
+  }
 
   return {
-    stats,
-    pageviews: pageviewsSeries,
-    topPages: topPages.pages,
-    devices: devices.devices,
-    channels: channels.channels,
-    activeVisitors: realtime.activeVisitors,
+    stats: sections.stats!,
+    pageviews: sections["pageviews-series"]!,
+    topPages: sections["top-pages"]!.pages,
+    devices: sections.devices!.devices,
+    channels: sections.channels!.channels,
+    activeVisitors: sections.realtime?.activeVisitors ?? 0,
     period,
   };
 }